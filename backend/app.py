@@ -1,15 +1,29 @@
 import os
 import sys
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from models.rag_engine import RAGEngine
 from utils.langchain_setup import langchain_setup
-from database.db_config import init_database, get_mysql_connection
+from utils.query_cache import LRUCache
+from utils.ttl_cache import ttl_cache
+from utils import json_utils
+from utils.job_store import JobStore
+from database.db_config import init_database, get_mysql_connection, pool_stats
 from config import Config
 import logging
 import os
-from werkzeug.utils import secure_filename
-from PyPDF2 import PdfReader
+import hashlib
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+try:
+    import fitz  # PyMuPDF: much faster page text extraction than PyPDF2
+except ImportError:
+    fitz = None
+    from PyPDF2 import PdfReader
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,14 +32,68 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+def json_response(payload, status=200):
+    """jsonify() equivalent serialized with orjson (pre-serialized bytes are sent as-is)"""
+    body = payload if isinstance(payload, bytes) else json_utils.dumps(payload)
+    return Response(body, status=status, mimetype='application/json')
+
+# Fixed /api/query error bodies, serialized once
+_QUERY_NOT_READY = json_utils.dumps({
+    "success": False,
+    "error": "RAG engine not initialized",
+    "response": {
+        "answer": "System is still initializing, please try again shortly.",
+        "type": "error",
+        "visualizations": {},
+        "recommendations": []
+    }
+})
+_QUERY_MISSING_QUESTION = json_utils.dumps({
+    "success": False,
+    "error": "No question provided",
+    "response": {
+        "answer": "Please provide a question.",
+        "type": "error",
+        "visualizations": {},
+        "recommendations": []
+    }
+})
+
 # Global RAG engine instance
 rag_engine = None
 
+# Raw uploads are kept here for re-ingestion (created once in initialize_services)
+UPLOAD_DIR = os.path.join('/app', 'data', 'uploads')
+
+# Exact (question, language) repeats; near-duplicate questions are cached inside RAGEngine
+_exact_cache = LRUCache(maxsize=Config.QUERY_CACHE_SIZE, ttl=Config.QUERY_CACHE_TTL)
+
+def _exact_cache_key(question, language):
+    return hashlib.sha256(f"{question.strip().lower()}\0{language}".encode("utf-8")).hexdigest()
+
+def _remember_result(question, language, result):
+    if result.get("type") == "error":
+        return
+    _exact_cache.put(_exact_cache_key(question, language), result)
+
+def _stream_query_events(question, language, cached):
+    if cached is not None:
+        events = iter([{"type": "result", "response": cached}])
+    else:
+        events = rag_engine.stream_query(question, language)
+    for event in events:
+        # Streamed answers arrive without whole-answer audio, so they are not cached for /api/query
+        if event["type"] == "result" and cached is None and "audio" in event["response"]:
+            _remember_result(question, language, event["response"])
+        yield json_utils.dumps(event) + b"\n"
+
 def initialize_services():
     """Initialize all services on startup"""
     global rag_engine
     
     try:
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+
         # Initialize LangChain components
         embedding_info = langchain_setup.get_embedding_model_info()
         logger.info(f"🚀 LangChain initialized with: {embedding_info.get('model_name', 'Unknown')}")
@@ -46,15 +114,98 @@ def initialize_services():
         logger.error(f"❌ Service initialization failed: {e}")
         return False
 
+def start_worker_tasks():
+    """Per-process setup and background work; runs in each worker, after the fork"""
+    if rag_engine is not None:
+        # SQLite handles (Chroma) opened by the preloading master must not be reused here
+        rag_engine.chroma_manager.reopen()
+        rag_engine.prewarm_tts()
+        rag_engine.register_query_cache_save()
+
 # File upload and ingestion
 ALLOWED_EXTENSIONS = {"csv", "pdf"}
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# MuPDF is not thread-safe, even across separate fitz.Documents in one process:
+# every PyMuPDF call in this process runs under this lock
+_FITZ_LOCK = threading.Lock()
+
+# Anything outside a conservative filename alphabet (incl. path separators) becomes "_"
+_FNAME_RE = re.compile(r'[^A-Za-z0-9._-]+')
+MAX_FILENAME_LENGTH = 255
+
+def sanitize_filename(filename):
+    """Make an uploaded filename safe to join onto the upload directory"""
+    name = _FNAME_RE.sub('_', filename).lstrip('.')
+    if len(name) > MAX_FILENAME_LENGTH:
+        stem, dot, ext = name.rpartition('.')
+        name = stem[:MAX_FILENAME_LENGTH - len(ext) - 1] + dot + ext if dot else name[:MAX_FILENAME_LENGTH]
+    return name or 'upload'
+
+def extract_pdf_pages(buf):
+    """Return the text of every non-empty page of an in-memory PDF (PyMuPDF, PyPDF2 fallback)"""
+    if fitz is not None:
+        with _FITZ_LOCK, fitz.open(stream=buf, filetype="pdf") as doc:
+            pages = [page.get_text("text") for page in doc]
+        return [t for t in pages if t.strip()]
+    reader = PdfReader(BytesIO(buf))
+    pages = ((page.extract_text() or '') for page in reader.pages)
+    return [t for t in pages if t.strip()]
+
+def pdf_has_text(buf, sample_pages=2):
+    """Cheap pre-check: False when the first pages have no text layer (scanned/image-only PDF)"""
+    if fitz is None:
+        return True
+    with _FITZ_LOCK, fitz.open(stream=buf, filetype="pdf") as doc:
+        sample = "".join(
+            doc.load_page(i).get_text("text", flags=fitz.TEXT_INHIBIT_SPACES)
+            for i in range(min(sample_pages, doc.page_count))
+        )
+    return bool(sample.strip())
+
+def persist_upload(path, buf):
+    """Write the raw upload to disk off the request path so it overlaps ingestion"""
+    def _write():
+        try:
+            with open(path, 'wb') as fh:
+                fh.write(buf)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not persist upload {path}: {e}")
+    threading.Thread(target=_write, daemon=True).start()
+
+# Uploads are ingested off the request thread; clients poll the job status
+_ingest_executor = ThreadPoolExecutor(max_workers=Config.INGEST_WORKERS, thread_name_prefix="ingest")
+job_store = JobStore(Config.JOB_DB_PATH)
+
+def ingest_upload(job_id, buf, ext, filename, doc_type):
+    """Background job: parse an uploaded file and add it to Chroma"""
+    job_store.update(job_id, "running")
+    try:
+        if ext == 'csv':
+            success = rag_engine.chroma_manager.add_csv_data(buf, doc_type, source_name=filename)
+        else:
+            # PDF: extract text
+            pages_text = extract_pdf_pages(buf)
+            # Build documents and embed them in a single batched add
+            from langchain_core.documents import Document
+            docs = [Document(page_content=t, metadata={"source": filename, "type": doc_type, "page": idx+1}) for idx, t in enumerate(pages_text)]
+            success = rag_engine.chroma_manager.add_documents_cached(docs)
+
+        if success:
+            job_store.update(job_id, "done")
+        else:
+            job_store.update(job_id, "failed", "Ingestion failed (embeddings offline or parsing error)")
+    except Exception as e:
+        logger.error(f"❌ {ext.upper()} ingestion error: {e}")
+        job_store.update(job_id, "failed", str(e))
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     try:
+        if rag_engine is None:
+            return jsonify({"success": False, "error": "RAG engine not initialized"}), 503
         if 'file' not in request.files:
             return jsonify({"success": False, "error": "No file part"}), 400
         file = request.files['file']
@@ -64,41 +215,43 @@ def upload_file():
         if not allowed_file(file.filename):
             return jsonify({"success": False, "error": "Unsupported file type"}), 400
 
-        filename = secure_filename(file.filename)
-        upload_dir = os.path.join('/app', 'data', 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
-        saved_path = os.path.join(upload_dir, filename)
-        file.save(saved_path)
+        filename = sanitize_filename(file.filename)
+        saved_path = os.path.join(UPLOAD_DIR, filename)
 
-        # Ingest into Chroma via rag_engine
+        # Parse straight from memory; the disk copy is only kept for re-ingestion
+        buf = file.read()
         ext = filename.rsplit('.', 1)[1].lower()
-        if ext == 'csv':
-            success = rag_engine.chroma_manager.add_csv_data(saved_path, doc_type)
-        else:
-            # PDF: extract text
-            try:
-                reader = PdfReader(saved_path)
-                pages_text = []
-                for i, page in enumerate(reader.pages):
-                    text = page.extract_text() or ''
-                    if text.strip():
-                        pages_text.append(text)
-                # Build documents
-                from langchain_core.documents import Document
-                docs = [Document(page_content=t, metadata={"source": filename, "type": doc_type, "page": idx+1}) for idx, t in enumerate(pages_text)]
-                success = rag_engine.chroma_manager.add_documents(docs)
-            except Exception as e:
-                logger.error(f"❌ PDF ingestion error: {e}")
-                success = False
-
-        if not success:
-            return jsonify({"success": False, "error": "Ingestion failed (embeddings offline or parsing error)"}), 500
-
-        return jsonify({"success": True, "message": "File ingested successfully"})
+        if ext == 'pdf' and not pdf_has_text(buf):
+            return jsonify({"success": False, "error": "No extractable text (scanned PDF?)"}), 415
+        persist_upload(saved_path, buf)
+
+        # Ingest into Chroma via rag_engine in the background
+        job_id = uuid.uuid4().hex
+        job_store.create(job_id, filename)
+        _ingest_executor.submit(ingest_upload, job_id, buf, ext, filename, doc_type)
+
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/upload/status/{job_id}"
+        }), 202
     except Exception as e:
         logger.error(f"❌ Upload error: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/upload/status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    """Poll the state of a background ingestion job"""
+    try:
+        job = job_store.get(job_id)
+        if job is None:
+            return jsonify({"success": False, "error": "Unknown job id"}), 404
+        return jsonify({"success": True, "job": job})
+    except Exception as e:
+        logger.error(f"❌ Upload status error: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -112,44 +265,37 @@ def handle_query():
     """Main query endpoint - UPDATED for structured response"""
     try:
         if rag_engine is None:
-            return jsonify({
-                "success": False,
-                "error": "RAG engine not initialized",
-                "response": {
-                    "answer": "System is still initializing, please try again shortly.",
-                    "type": "error",
-                    "visualizations": {},
-                    "recommendations": []
-                }
-            }), 503
+            return json_response(_QUERY_NOT_READY, 503)
         
         data = request.get_json()
         question = data.get('question', '')
         language = data.get('language', 'en')
         
         if not question:
-            return jsonify({
-                "success": False,
-                "error": "No question provided",
-                "response": {
-                    "answer": "Please provide a question.",
-                    "type": "error", 
-                    "visualizations": {},
-                    "recommendations": []
-                }
-            }), 400
+            return json_response(_QUERY_MISSING_QUESTION, 400)
         
-        # Process the query - now returns structured data
-        result = rag_engine.query(question, language)
+        result = _exact_cache.get(_exact_cache_key(question, language))
+
+        if data.get('stream'):
+            # NDJSON: answer bullets as they are generated, then the full structured response
+            return Response(
+                stream_with_context(_stream_query_events(question, language, result)),
+                mimetype='application/x-ndjson'
+            )
+
+        if result is None:
+            # Process the query - now returns structured data
+            result = rag_engine.query(question, language)
+            _remember_result(question, language, result)
         
-        return jsonify({
+        return json_response({
             "success": True,
             "response": result  # Contains answer + visualizations + recommendations
         })
         
     except Exception as e:
         logger.error(f"❌ Query processing error: {e}")
-        return jsonify({
+        return json_response({
             "success": False,
             "error": str(e),
             "response": {
@@ -158,39 +304,62 @@ def handle_query():
                 "visualizations": {},
                 "recommendations": []
             }
-        }), 500
+        }, 500)
+
+@ttl_cache(seconds=5)
+def fetch_system_status():
+    """Service health flags, shared across dashboard polls for a few seconds"""
+    status = {
+        "database": False,
+        "chromadb": False,
+        "mistral_ai": False,
+        "services_ready": rag_engine is not None
+    }
+    
+    # Check database
+    try:
+        conn = get_mysql_connection()
+        if conn:
+            status["database"] = True
+            conn.close()
+    except:
+        status["database"] = False
+        
+    # Check ChromaDB (through RAG engine)
+    if rag_engine and rag_engine.chroma_manager and rag_engine.chroma_manager.client:
+        status["chromadb"] = True
+        
+    # Check Mistral (through RAG engine)  
+    if rag_engine and rag_engine.mistral:
+        status["mistral_ai"] = True
+
+    return status
+
+@app.route('/api/tts', methods=['POST'])
+def stream_tts():
+    """Stream speech for arbitrary text as NDJSON, one audio chunk per sentence"""
+    if rag_engine is None:
+        return jsonify({"success": False, "error": "RAG engine not initialized"}), 503
+
+    data = request.get_json(silent=True) or {}
+    text = data.get('text', '')
+    language = data.get('language', 'en')
+    if not text.strip():
+        return jsonify({"success": False, "error": "No text provided"}), 400
+
+    def _events():
+        for chunk in rag_engine.tts.text_to_speech_stream(text, language):
+            yield json_utils.dumps(chunk) + b"\n"
+
+    return Response(stream_with_context(_events()), mimetype='application/x-ndjson')
 
 @app.route('/api/system-status', methods=['GET'])
 def get_system_status():
     """Get overall system status for dashboard"""
     try:
-        status = {
-            "database": False,
-            "chromadb": False,
-            "mistral_ai": False,
-            "services_ready": rag_engine is not None
-        }
-        
-        # Check database
-        try:
-            conn = get_mysql_connection()
-            if conn:
-                status["database"] = True
-                conn.close()
-        except:
-            status["database"] = False
-            
-        # Check ChromaDB (through RAG engine)
-        if rag_engine and rag_engine.chroma_manager and rag_engine.chroma_manager.client:
-            status["chromadb"] = True
-            
-        # Check Mistral (through RAG engine)  
-        if rag_engine and rag_engine.mistral:
-            status["mistral_ai"] = True
-            
         return jsonify({
             "success": True,
-            "status": status,
+            "status": fetch_system_status(),
             "timestamp": "2024-01-15T10:30:00Z"
         })
         
@@ -201,45 +370,50 @@ def get_system_status():
             "error": str(e)
         }), 500
 
+@ttl_cache(seconds=3600)
+def quick_actions_payload():
+    """Static sidebar suggestions"""
+    return {
+        "success": True,
+        "quick_actions": [
+            {
+                "icon": "🚨", 
+                "text": "Check Critical Alerts", 
+                "suggestion": "Show me equipment with critical status"
+            },
+            {
+                "icon": "📊", 
+                "text": "Production Efficiency", 
+                "suggestion": "What is our current production efficiency?"
+            },
+            {
+                "icon": "🛡️", 
+                "text": "Safety Overview", 
+                "suggestion": "Recent safety incidents and trends"
+            },
+            {
+                "icon": "🔧", 
+                "text": "Maintenance Status", 
+                "suggestion": "Which equipment needs maintenance?"
+            },
+            {
+                "icon": "⚡", 
+                "text": "Fuel Consumption", 
+                "suggestion": "How is our fuel consumption across sites?"
+            }
+        ],
+        "recent_activity": [
+            "Equipment status checked",
+            "Production report generated", 
+            "Safety audit completed"
+        ]
+    }
+
 @app.route('/api/quick-actions', methods=['GET'])
 def get_quick_actions():
     """Get quick actions and suggestions for sidebar"""
     try:
-        return jsonify({
-            "success": True,
-            "quick_actions": [
-                {
-                    "icon": "🚨", 
-                    "text": "Check Critical Alerts", 
-                    "suggestion": "Show me equipment with critical status"
-                },
-                {
-                    "icon": "📊", 
-                    "text": "Production Efficiency", 
-                    "suggestion": "What is our current production efficiency?"
-                },
-                {
-                    "icon": "🛡️", 
-                    "text": "Safety Overview", 
-                    "suggestion": "Recent safety incidents and trends"
-                },
-                {
-                    "icon": "🔧", 
-                    "text": "Maintenance Status", 
-                    "suggestion": "Which equipment needs maintenance?"
-                },
-                {
-                    "icon": "⚡", 
-                    "text": "Fuel Consumption", 
-                    "suggestion": "How is our fuel consumption across sites?"
-                }
-            ],
-            "recent_activity": [
-                "Equipment status checked",
-                "Production report generated", 
-                "Safety audit completed"
-            ]
-        })
+        return jsonify(quick_actions_payload())
     except Exception as e:
         logger.error(f"❌ Quick actions error: {e}")
         return jsonify({
@@ -247,14 +421,19 @@ def get_quick_actions():
             "error": str(e)
         }), 500
 
+@ttl_cache(seconds=3600)
+def languages_payload():
+    """Supported TTS languages"""
+    return {
+        "success": True,
+        "languages": Config.SUPPORTED_LANGUAGES
+    }
+
 @app.route('/api/languages', methods=['GET'])
 def get_languages():
     """Get supported languages for TTS"""
     try:
-        return jsonify({
-            "success": True,
-            "languages": Config.SUPPORTED_LANGUAGES
-        })
+        return jsonify(languages_payload())
     except Exception as e:
         logger.error(f"❌ Languages endpoint error: {e}")
         return jsonify({
@@ -269,11 +448,14 @@ def get_languages():
         }), 500
 
 # ✅ ADDED: MySQL Data Endpoints (for sidebar)
+MAX_INCIDENTS_LIMIT = 100
+MAINTENANCE_ALERTS_LIMIT = 10
+
 @app.route('/api/incidents', methods=['GET'])
 def get_incidents():
     """Get recent safety incidents"""
     try:
-        limit = request.args.get('limit', 5, type=int)
+        limit = min(max(request.args.get('limit', 5, type=int), 1), MAX_INCIDENTS_LIMIT)
         conn = get_mysql_connection()
         cursor = conn.cursor(dictionary=True)
         
@@ -288,18 +470,18 @@ def get_incidents():
         cursor.close()
         conn.close()
         
-        return jsonify({
+        return json_response({
             "success": True,
             "incidents": rows
         })
         
     except Exception as e:
         logger.error(f"❌ Incidents endpoint error: {e}")
-        return jsonify({
+        return json_response({
             "success": False,
             "error": str(e),
             "incidents": []
-        }), 500
+        }, 500)
 
 @app.route('/api/maintenance-alerts', methods=['GET'])
 def get_maintenance_alerts():
@@ -319,74 +501,61 @@ def get_maintenance_alerts():
                     ELSE 3
                 END,
                 efficiency_score ASC
-            LIMIT 10
-        """)
+            LIMIT %s
+        """, (MAINTENANCE_ALERTS_LIMIT,))
         
         rows = cursor.fetchall()
         cursor.close()
         conn.close()
         
-        return jsonify({
+        return json_response({
             "success": True,
             "alerts": rows
         })
         
     except Exception as e:
         logger.error(f"❌ Maintenance alerts error: {e}")
-        return jsonify({
+        return json_response({
             "success": False,
             "error": str(e),
             "alerts": []
-        }), 500
+        }, 500)
 
-@app.route('/api/kpis', methods=['GET'])
-def get_kpis():
-    """Get current KPIs"""
+@ttl_cache(seconds=10)
+def fetch_kpis():
+    """Current KPIs, shared across dashboard polls for a few seconds"""
+    conn = get_mysql_connection()
+    cursor = conn.cursor(dictionary=True)
     try:
-        conn = get_mysql_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Total incidents (last 30 days)
-        cursor.execute("""
-            SELECT COUNT(*) as total_incidents 
-            FROM mining_incidents 
-            WHERE incident_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-        """)
-        total_incidents = cursor.fetchone()['total_incidents']
-        
-        # Critical equipment alerts
+        # All four KPIs in a single round-trip
         cursor.execute("""
-            SELECT COUNT(*) as critical_alerts 
-            FROM equipment_monitoring 
-            WHERE status = 'Critical'
+            SELECT
+                (SELECT COUNT(*) FROM mining_incidents
+                 WHERE incident_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)) AS total_incidents,
+                (SELECT COUNT(*) FROM equipment_monitoring
+                 WHERE status = 'Critical') AS critical_alerts,
+                (SELECT AVG(efficiency_percentage) FROM production_metrics) AS avg_efficiency,
+                (SELECT SUM(quantity_tons) FROM production_metrics) AS monthly_production
         """)
-        critical_alerts = cursor.fetchone()['critical_alerts']
-        
-        # Average efficiency (use all available data)
-        cursor.execute("""
-            SELECT AVG(efficiency_percentage) as avg_efficiency 
-            FROM production_metrics
-        """)
-        avg_efficiency = cursor.fetchone()['avg_efficiency'] or 0
-        
-        # Total production (use all available data)
-        cursor.execute("""
-            SELECT SUM(quantity_tons) as monthly_production 
-            FROM production_metrics
-        """)
-        monthly_production = cursor.fetchone()['monthly_production'] or 0
-        
+        row = cursor.fetchone()
+    finally:
         cursor.close()
         conn.close()
-        
+
+    return {
+        "total_incidents": row['total_incidents'],
+        "critical_alerts": row['critical_alerts'],
+        "avg_efficiency": round(float(row['avg_efficiency'] or 0), 2),
+        "monthly_production": float(row['monthly_production'] or 0)
+    }
+
+@app.route('/api/kpis', methods=['GET'])
+def get_kpis():
+    """Get current KPIs"""
+    try:
         return jsonify({
             "success": True,
-            "kpis": {
-                "total_incidents": total_incidents,
-                "critical_alerts": critical_alerts,
-                "avg_efficiency": round(float(avg_efficiency), 2),
-                "monthly_production": float(monthly_production)
-            }
+            "kpis": fetch_kpis()
         })
         
     except Exception as e:
@@ -427,10 +596,16 @@ def test_endpoint():
             "error": str(e)
         }), 500
 
+@app.route('/debug/pool', methods=['GET'])
+def debug_pool():
+    """MySQL connection pool occupancy for this worker"""
+    return jsonify({**pool_stats(), "pid": os.getpid()})
+
 if __name__ == '__main__':
     # Initialize services
     if initialize_services():
         logger.info("🎉 All services initialized successfully!")
+        start_worker_tasks()
         app.run(host='0.0.0.0', port=5000, debug=True)
     else:
         logger.error("💥 Failed to initialize services, exiting...")
@@ -14,9 +14,11 @@ class Config:
     MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', 'mining_password_456')
     MYSQL_DB = os.getenv('MYSQL_DATABASE', 'mining_data')
     MYSQL_PORT = int(os.getenv('MYSQL_PORT', '3306'))
+    MYSQL_POOL_SIZE = int(os.getenv('MYSQL_POOL_SIZE', '20'))  # mysql-connector caps pools at 32
     
     # ✅ UPDATED: ChromaDB Local Storage (not server)
     CHROMA_PERSIST_DIR = os.getenv('CHROMA_PERSIST_DIR', './chroma_data')
+    EMBED_CACHE_PATH = os.getenv('EMBED_CACHE_PATH', os.path.join(CHROMA_PERSIST_DIR, 'embed_cache.sqlite3'))
     
     # ✅ ADDED: Ollama Configuration (Free Local LLM)
     OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'localhost')
@@ -29,12 +31,48 @@ class Config:
     
     # Model Settings
     EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+    # 'torch' (SentenceTransformer), 'onnx' (ONNX Runtime; int8 model from scripts/export_onnx_embeddings.py,
+    # else an FP32 export) or 'auto' (ONNX when an exported model exists, else torch)
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'auto')
+    ONNX_EMBEDDING_DIR = os.getenv('ONNX_EMBEDDING_DIR', './models_cache/minilm-onnx')
+    ONNX_EMBEDDING_FILE = os.getenv('ONNX_EMBEDDING_FILE', 'model_int8.onnx')
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
+    # Worker processes that embed large CSV uploads on CPU (each loads its own model); <= 1 disables
+    EMBED_PROCESSES = int(os.getenv('EMBED_PROCESSES', str(min(4, (os.cpu_count() or 1) // 2))))
+    PARALLEL_EMBED_MIN_ROWS = int(os.getenv('PARALLEL_EMBED_MIN_ROWS', '5000'))
     
     # RAG Settings
     TOP_K_RESULTS = 5
+    # In-memory retrieval index: 'auto' (FAISS if installed), 'faiss' or 'numpy'
+    VECTOR_INDEX_BACKEND = os.getenv('VECTOR_INDEX_BACKEND', 'auto')
+    # FAISS switches from exact IndexFlatIP to IndexHNSWFlat at this many vectors
+    VECTOR_INDEX_HNSW_THRESHOLD = int(os.getenv('VECTOR_INDEX_HNSW_THRESHOLD', '100000'))
+    VECTOR_INDEX_PATH = os.getenv('VECTOR_INDEX_PATH', os.path.join(CHROMA_PERSIST_DIR, 'vector_index.faiss'))
+    # 'float32' or 'int8' (4x less index RAM, slightly lower recall; check it on your data first)
+    VECTOR_INDEX_PRECISION = os.getenv('VECTOR_INDEX_PRECISION', 'float32')
     MAX_RESPONSE_LENGTH = 500  # 3-4 sentences
+    # Each query runs Mistral and Ollama side by side, so two pool threads per Gunicorn request thread
+    LLM_POOL_WORKERS = int(os.getenv('LLM_POOL_WORKERS', str(2 * int(os.getenv('GUNICORN_THREADS', '8')))))
+
+    # Background ingestion of uploaded files
+    INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '2'))
+    JOB_DB_PATH = os.getenv('JOB_DB_PATH', './data/upload_jobs.sqlite3')
+
+    # Query result caches: exact hits in the API layer, near-duplicates inside RAGEngine
+    QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '512'))
+    QUERY_CACHE_TTL = int(os.getenv('QUERY_CACHE_TTL', '300'))  # seconds
+    SEMANTIC_CACHE_SIZE = int(os.getenv('SEMANTIC_CACHE_SIZE', '1000'))
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+    SEMANTIC_CACHE_TTL = int(os.getenv('SEMANTIC_CACHE_TTL', '1800'))  # seconds
+    SEMANTIC_CACHE_PATH = os.getenv('SEMANTIC_CACHE_PATH', os.path.join(CHROMA_PERSIST_DIR, 'query_cache'))
+    DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', '60'))  # seconds, KPI/chart helpers
+
+    # Synthesized speech cache (memory LRU + on-disk MP3s)
+    TTS_CACHE_SIZE = int(os.getenv('TTS_CACHE_SIZE', '512'))
+    TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', './cache/tts')
+    # Local Piper voices ({lang}.onnx + {lang}.onnx.json); missing languages fall back to gTTS
+    PIPER_VOICES_DIR = os.getenv('PIPER_VOICES_DIR', './piper-voices')
     
     # Supported Languages for TTS
     SUPPORTED_LANGUAGES = {
@@ -1,23 +1,71 @@
 # backend/database/db_config.py
 import mysql.connector
+from mysql.connector import pooling
 from sqlalchemy import create_engine
 from config import Config  # ← Changed this line
+from database.recent_events import ensure_recent_events
 import logging
+import threading
 import time
 
 logger = logging.getLogger(__name__)
 
+_pool = None
+_pool_lock = threading.Lock()
+
+def _connection_args():
+    return dict(
+        host=Config.MYSQL_HOST,
+        user=Config.MYSQL_USER,
+        password=Config.MYSQL_PASSWORD,
+        database=Config.MYSQL_DB,
+        port=Config.MYSQL_PORT
+    )
+
+def _get_pool():
+    """Create the shared connection pool on first use (MySQL may not be up at import time)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name="rocket",
+                    pool_size=Config.MYSQL_POOL_SIZE,
+                    # Clear session state (temp tables, variables) before a connection is reused
+                    pool_reset_session=True,
+                    **_connection_args()
+                )
+                logger.info(f"✅ MySQL connection pool ready (size={Config.MYSQL_POOL_SIZE})")
+    return _pool
+
+def reset_pool():
+    """Drop the shared pool (e.g. after fork) so the next caller builds a fresh one"""
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+def pool_stats():
+    """Pool size and idle connection count, for the /debug/pool endpoint"""
+    pool = _pool
+    if pool is None:
+        return {"initialized": False, "pool_size": Config.MYSQL_POOL_SIZE}
+    idle = pool._cnx_queue.qsize()
+    return {
+        "initialized": True,
+        "pool_name": pool.pool_name,
+        "pool_size": pool.pool_size,
+        "idle": idle,
+        "in_use": pool.pool_size - idle
+    }
+
 def get_mysql_connection():
-    """Create MySQL connection"""
+    """Get a pooled MySQL connection; conn.close() returns it to the pool"""
     try:
-        conn = mysql.connector.connect(
-            host=Config.MYSQL_HOST,
-            user=Config.MYSQL_USER,
-            password=Config.MYSQL_PASSWORD,
-            database=Config.MYSQL_DB,
-            port=Config.MYSQL_PORT
-        )
-        return conn
+        return _get_pool().get_connection()
+    except pooling.PoolError:
+        # Pool exhausted under a burst: fall back to a dedicated connection
+        logger.warning("⚠️ MySQL pool exhausted, opening a dedicated connection")
+        return mysql.connector.connect(**_connection_args())
     except Exception as e:
         logger.error(f"MySQL connection failed: {e}")
         raise
@@ -35,8 +83,11 @@ def init_database(retries=10, delay=5):
     for i in range(retries):
         try:
             conn = get_mysql_connection()
-            conn.close()
             logger.info("✅ MySQL connection successful")
+            try:
+                ensure_recent_events(conn)
+            finally:
+                conn.close()
             return True
         except Exception as e:
             logger.warning(f"Attempt {i+1}/{retries}: MySQL not ready yet. Retrying in {delay}s...")
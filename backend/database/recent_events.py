@@ -0,0 +1,228 @@
+# backend/database/recent_events.py
+"""
+recent_events: a small summary table of the latest incidents, non-operational equipment and
+production records, kept current by triggers. It serves the default SQL context without a
+three-table UNION over the source tables.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+_ready = False
+
+# Rows kept per source_type; the triggers trim the oldest row once a source goes over this
+RECENT_EVENTS_KEEP = 50
+
+# equipment rows are keyed by equipment_id (source_key) so status updates replace the previous row;
+# incident and production rows by an MD5 of their content, so the backfill can skip rows the
+# triggers already copied
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS recent_events (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        source_type VARCHAR(16) NOT NULL,
+        source_key VARCHAR(64) NULL,
+        date DATETIME NULL,
+        name VARCHAR(255) NULL,
+        metric VARCHAR(64) NULL,
+        details TEXT NULL,
+        UNIQUE KEY uq_recent_events_source (source_type, source_key),
+        INDEX idx_recent_events_type_date (source_type, date)
+    )
+"""
+
+def _incident_key(row):
+    return f"MD5(CONCAT_WS('|', {row}incident_date, {row}mine_name, {row}severity, {row}description))"
+
+def _incident_values(row):
+    return (
+        f"'incident', {_incident_key(row)}, "
+        f"{row}incident_date, {row}mine_name, {row}severity, {row}description"
+    )
+
+def _production_details(row):
+    return f"CONCAT('Production: ', {row}quantity_tons, ' tons')"
+
+def _production_key(row):
+    return f"MD5(CONCAT_WS('|', {row}metric_date, {row}site_name, {row}efficiency_percentage, {_production_details(row)}))"
+
+def _production_values(row):
+    return (
+        f"'production', {_production_key(row)}, "
+        f"{row}metric_date, {row}site_name, {row}efficiency_percentage, {_production_details(row)}"
+    )
+
+_COLUMNS = "(source_type, source_key, date, name, metric, details)"
+
+# Newest RECENT_EVENTS_KEEP rows per source; INSERT IGNORE skips rows already copied by a trigger
+BACKFILL = [
+    f"""
+    INSERT IGNORE INTO recent_events {_COLUMNS}
+    SELECT {_incident_values('')} FROM mining_incidents
+    ORDER BY incident_date DESC LIMIT {RECENT_EVENTS_KEEP}
+    """,
+    f"""
+    INSERT IGNORE INTO recent_events {_COLUMNS}
+    SELECT 'equipment', equipment_id, updated_at, equipment_id, status, alerts
+    FROM equipment_monitoring WHERE status != 'Operational'
+    ORDER BY updated_at DESC LIMIT {RECENT_EVENTS_KEEP}
+    """,
+    f"""
+    INSERT IGNORE INTO recent_events {_COLUMNS}
+    SELECT {_production_values('')} FROM production_metrics
+    ORDER BY metric_date DESC LIMIT {RECENT_EVENTS_KEEP}
+    """,
+]
+
+# Drops everything beyond the newest RECENT_EVENTS_KEEP rows of each source
+# (the derived table is materialized, which MySQL requires to delete from the table it reads)
+PRUNE = f"""
+    DELETE r FROM recent_events r
+    JOIN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY source_type ORDER BY date DESC, id DESC) AS rn
+            FROM recent_events
+        ) ranked
+        WHERE rn > {RECENT_EVENTS_KEEP}
+    ) old ON old.id = r.id
+"""
+
+def _trim(source_type):
+    # At most one row goes in per trigger call, so dropping the oldest one keeps the bound
+    return f"""
+        IF (SELECT COUNT(*) FROM recent_events WHERE source_type = '{source_type}') > {RECENT_EVENTS_KEEP} THEN
+            DELETE FROM recent_events WHERE source_type = '{source_type}' ORDER BY date ASC, id ASC LIMIT 1;
+        END IF;
+    """
+
+_EQUIPMENT_UPSERT = f"""
+    IF NEW.status != 'Operational' THEN
+        INSERT INTO recent_events {_COLUMNS}
+        VALUES ('equipment', NEW.equipment_id, NEW.updated_at, NEW.equipment_id, NEW.status, NEW.alerts)
+        ON DUPLICATE KEY UPDATE date = VALUES(date), metric = VALUES(metric), details = VALUES(details);
+        {_trim('equipment')}
+    ELSE
+        DELETE FROM recent_events WHERE source_type = 'equipment' AND source_key = NEW.equipment_id;
+    END IF;
+"""
+
+def _delete_mirror(source_type, key):
+    return f"DELETE FROM recent_events WHERE source_type = '{source_type}' AND source_key = {key};"
+
+# Name suffixes version the trigger bodies (bump one whenever its body changes); any other
+# trg_recent_events_* trigger is dropped as stale.
+# Updates replace the mirrored row (found by the OLD content key) and deletes remove it,
+# so edited or deleted source rows never linger in the SQL context
+TRIGGERS = {
+    "trg_recent_events_incident_v2": f"""
+        CREATE TRIGGER trg_recent_events_incident_v2 AFTER INSERT ON mining_incidents FOR EACH ROW
+        BEGIN
+            INSERT IGNORE INTO recent_events {_COLUMNS} VALUES ({_incident_values('NEW.')});
+            {_trim('incident')}
+        END
+    """,
+    "trg_recent_events_incident_upd_v2": f"""
+        CREATE TRIGGER trg_recent_events_incident_upd_v2 AFTER UPDATE ON mining_incidents FOR EACH ROW
+        BEGIN
+            {_delete_mirror('incident', _incident_key('OLD.'))}
+            INSERT IGNORE INTO recent_events {_COLUMNS} VALUES ({_incident_values('NEW.')});
+            {_trim('incident')}
+        END
+    """,
+    "trg_recent_events_incident_del_v2": f"""
+        CREATE TRIGGER trg_recent_events_incident_del_v2 AFTER DELETE ON mining_incidents FOR EACH ROW
+        BEGIN {_delete_mirror('incident', _incident_key('OLD.'))} END
+    """,
+    "trg_recent_events_equipment_ins_v2": f"""
+        CREATE TRIGGER trg_recent_events_equipment_ins_v2 AFTER INSERT ON equipment_monitoring FOR EACH ROW
+        BEGIN {_EQUIPMENT_UPSERT} END
+    """,
+    "trg_recent_events_equipment_upd_v3": f"""
+        CREATE TRIGGER trg_recent_events_equipment_upd_v3 AFTER UPDATE ON equipment_monitoring FOR EACH ROW
+        BEGIN
+            IF NOT (OLD.equipment_id <=> NEW.equipment_id) THEN
+                {_delete_mirror('equipment', 'OLD.equipment_id')}
+            END IF;
+            {_EQUIPMENT_UPSERT}
+        END
+    """,
+    "trg_recent_events_equipment_del_v2": f"""
+        CREATE TRIGGER trg_recent_events_equipment_del_v2 AFTER DELETE ON equipment_monitoring FOR EACH ROW
+        BEGIN {_delete_mirror('equipment', 'OLD.equipment_id')} END
+    """,
+    "trg_recent_events_production_v2": f"""
+        CREATE TRIGGER trg_recent_events_production_v2 AFTER INSERT ON production_metrics FOR EACH ROW
+        BEGIN
+            INSERT IGNORE INTO recent_events {_COLUMNS} VALUES ({_production_values('NEW.')});
+            {_trim('production')}
+        END
+    """,
+    "trg_recent_events_production_upd_v2": f"""
+        CREATE TRIGGER trg_recent_events_production_upd_v2 AFTER UPDATE ON production_metrics FOR EACH ROW
+        BEGIN
+            {_delete_mirror('production', _production_key('OLD.'))}
+            INSERT IGNORE INTO recent_events {_COLUMNS} VALUES ({_production_values('NEW.')});
+            {_trim('production')}
+        END
+    """,
+    "trg_recent_events_production_del_v2": f"""
+        CREATE TRIGGER trg_recent_events_production_del_v2 AFTER DELETE ON production_metrics FOR EACH ROW
+        BEGIN {_delete_mirror('production', _production_key('OLD.'))} END
+    """,
+}
+
+# Two newest rows per source, then newest first; every branch is an index range scan on 2 rows
+RECENT_EVENTS_SQL = """
+    (SELECT source_type, date, name, metric, details FROM recent_events
+     WHERE source_type = 'incident' ORDER BY date DESC LIMIT 2)
+    UNION ALL
+    (SELECT source_type, date, name, metric, details FROM recent_events
+     WHERE source_type = 'equipment' ORDER BY date DESC LIMIT 2)
+    UNION ALL
+    (SELECT source_type, date, name, metric, details FROM recent_events
+     WHERE source_type = 'production' ORDER BY date DESC LIMIT 2)
+    ORDER BY date DESC
+"""
+
+def ensure_recent_events(conn):
+    """
+    Create the table and triggers if missing, then backfill and prune; returns readiness.
+    CREATE/DROP TRIGGER commit implicitly, so this is not atomic: every step is idempotent
+    instead, and a run that fails part-way is completed by the next one.
+    """
+    global _ready
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CREATE_TABLE)
+        cursor.execute(
+            "SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE() "
+            "AND TRIGGER_NAME LIKE 'trg\\_recent\\_events\\_%'"
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        stale = existing - TRIGGERS.keys()
+        missing = [name for name in TRIGGERS if name not in existing]
+        if stale or missing:
+            for name in stale:
+                cursor.execute(f"DROP TRIGGER IF EXISTS `{name}`")
+            # Rows from the old, unkeyed triggers can't be deduplicated; the backfill replaces them
+            cursor.execute("DELETE FROM recent_events WHERE source_key IS NULL")
+            conn.commit()
+            # Triggers first, so rows inserted during the backfill are captured by them;
+            # the backfill then skips anything a trigger already copied
+            for name in missing:
+                cursor.execute(TRIGGERS[name])
+            for sql in BACKFILL:
+                cursor.execute(sql)
+        cursor.execute(PRUNE)
+        conn.commit()
+        _ready = True
+        logger.info("✅ recent_events summary table ready")
+    except Exception as e:
+        conn.rollback()
+        _ready = False
+        logger.warning(f"⚠️ recent_events unavailable, using UNION fallback: {e}")
+    finally:
+        cursor.close()
+    return _ready
+
+def recent_events_ready():
+    return _ready
@@ -0,0 +1,41 @@
+# backend/gunicorn.conf.py
+"""
+Gunicorn settings for production: threaded workers over a preloaded app.
+Run with: gunicorn -c gunicorn.conf.py
+"""
+import os
+
+wsgi_app = "wsgi:application"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+
+# gthread workers keep dashboard polls from queueing behind slow RAG queries.
+# One worker by default: threads provide the concurrency, and each worker has its own
+# embedded Chroma client and in-memory vector index, so an upload handled by one worker
+# would stay invisible to the others (and embedded Chroma does not support several
+# writer processes on one directory)
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# Import wsgi (and initialize_services) once in the master so the embedding model
+# is loaded before forking (shared copy-on-write if GUNICORN_WORKERS is raised)
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Sockets opened by the master must not be shared across processes
+    from database.db_config import reset_pool
+    reset_pool()
+
+    # Workers share the CPU; one intra-op thread each avoids MKL/OpenMP oversubscription
+    try:
+        import torch
+        torch.set_num_threads(int(os.getenv("TORCH_WORKER_THREADS", "1")))
+    except ImportError:
+        pass
+
+    # Threads don't survive the fork and SQLite connections must not cross it, so per-worker
+    # setup (Chroma reconnect; the embedding cache reopens itself per pid) and background work start here
+    from app import start_worker_tasks
+    start_worker_tasks()
@@ -1,91 +1,193 @@
 from mistralai import Mistral
 from config import Config
 from time import sleep
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from models.ollama_client import OllamaClient
+from utils import json_utils
+from string import Template
+import random
+import re
+
+# Inline bullet separators (" • ", " - ") and line-leading markers become line breaks
+_SEP_RE = re.compile(r"[ \t]+[•-][ \t]+|\n[ \t]*[•-][ \t]+")
+# One bullet per non-blank line, leading marker and surrounding whitespace stripped;
+# a "-" counts as a marker only when whitespace follows, so "-5% downtime" keeps its sign
+_BULLET_RE = re.compile(r"(?m)^[ \t]*(?:-[ \t]+|•[ \t]*)?(\S.*?)\s*$")
+
+def bullet_lines(raw):
+    """Split free-form model output into "- " prefixed bullet lines"""
+    return [f"- {m.group(1)}" for m in _BULLET_RE.finditer(_SEP_RE.sub("\n", raw))]
+
+def normalize_bullets(raw, limit=5):
+    """Rewrite free-form model output as at most `limit` "- " bullet lines"""
+    lines = bullet_lines(raw)
+    return "\n".join(lines[:limit]) if lines else raw
 
 class MistralService:
+    # Retry delays grow exponentially; jitter spreads out clients hitting the same limit
+    RETRY_BASE_DELAY = 1.0
+    RETRY_ATTEMPTS = 2
+    UNAVAILABLE_MESSAGE = "Unable to generate response right now. Please try again shortly."
+    MAX_BULLETS = 5
+
+    # Static instructions go in their own system message so the server can reuse its prefix
+    SYSTEM_PROMPT = """You are an expert mining operations advisor.
+Use the context to answer in 3–5 short bullet points, max 18 words each.
+Be specific, actionable, data-grounded; avoid filler sentences and introductions.
+Output: Only bullet points ("- " prefix), no extra text before or after."""
+
+    # Prompt templates are compiled once; substitute() fills them per request
+    _USER_TMPL = Template("Context:\n$context\n\nQuestion: $query")
+    _REC_TMPL = Template("""
+You are an expert mining operations advisor. Based on the user's question, the assistant's answer, and the latest KPIs/charts, produce $max_recs short, specific actions for managers. Avoid generic advice; ground each item in the provided data when possible.
+
+Question:
+$question
+
+Assistant Answer (summary):
+$answer
+
+KPIs (JSON):
+$kpis
+
+Charts (JSON - brief):
+$charts
+
+Output format: plain list with one action per line, no numbering, each <= 20 words.
+""")
+    _REC_FALLBACK_TMPL = Template("KPIs: $kpis\nCharts: $charts\nAnswer: $answer")
+
     def __init__(self):
         self.client = Mistral(api_key=Config.MISTRAL_API_KEY)
         self.model = "mistral-small-latest"
         self.ollama = OllamaClient()
-    
-    def generate_response(self, context, query, max_tokens=150):
-        """
-        Generate concise, bulleted response
-        """
-        prompt = f"""You are an expert mining operations advisor.
-Use the context to answer in 3–5 short bullet points, max 18 words each.
-Be specific, actionable, data-grounded; avoid filler sentences and introductions.
+        # Runs the speculative Ollama call alongside Mistral retries; sized so concurrent
+        # requests on every worker thread never queue behind each other
+        self._executor = ThreadPoolExecutor(max_workers=Config.LLM_POOL_WORKERS, thread_name_prefix="llm")
 
-Context:
-{context}
+    @staticmethod
+    def _is_retryable(err):
+        """Capacity/rate-limit like errors are worth retrying"""
+        return "429" in err or "capacity" in err or "rate" in err
 
-Question: {query}
+    @staticmethod
+    def _ollama_failed(text):
+        # OllamaClient reports failures as text instead of raising
+        return not text or text.startswith("Error:") or text.startswith("Unable to generate response")
 
-Output: Only bullet points ("- " prefix), no extra text before or after."""
+    def _call_mistral(self, messages, max_tokens):
+        response = self.client.chat.complete(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.7
+        )
+        raw = response.choices[0].message.content.strip()
+        return normalize_bullets(raw)
 
-        messages = [{"role": "user", "content": prompt}]
-        
-        # Simple retry for transient capacity/rate issues
-        backoffs = [0, 1, 2]  # seconds
-        for i, delay in enumerate(backoffs):
+    def _retry_mistral(self, messages, max_tokens):
+        """Retry Mistral with exponential backoff plus jitter; raises the last error"""
+        for attempt in range(self.RETRY_ATTEMPTS):
+            sleep(self.RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5))
             try:
-                if delay:
-                    sleep(delay)
-                response = self.client.chat.complete(
-                    model=self.model,
-                    messages=messages,
-                    max_tokens=max_tokens,
-                    temperature=0.7
-                )
-                raw = response.choices[0].message.content.strip()
-                normalized = raw.replace(" • ", "\n- ").replace("\n• ", "\n- ")
-                normalized = normalized.replace(" - ", "\n- ")
-                lines = [l.strip() for l in normalized.splitlines() if l.strip()]
-                bullets = []
-                for l in lines:
-                    if not l.startswith("-"):
-                        l = f"- {l}"
-                    bullets.append(l)
-                answer = "\n".join(bullets[:5]) if bullets else raw
-                return answer
+                return self._call_mistral(messages, max_tokens)
             except Exception as e:
-                err = str(e)
-                # Retry only for capacity/rate-limit like errors
-                if "429" in err or "capacity" in err or "rate" in err:
+                if attempt == self.RETRY_ATTEMPTS - 1 or not self._is_retryable(str(e)):
+                    raise
+
+    def _build_messages(self, context, query):
+        return [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": self._USER_TMPL.substitute(context=context, query=query)}
+        ]
+
+    def generate_response(self, context, query, max_tokens=150):
+        """
+        Generate concise, bulleted response
+        """
+        messages = self._build_messages(context, query)
+
+        try:
+            return self._call_mistral(messages, max_tokens)
+        except Exception as e:
+            if not self._is_retryable(str(e)):
+                # Non-retryable -> straight to local Ollama fallback
+                try:
+                    return self.ollama.generate_response(context, query, max_tokens=max_tokens)
+                except Exception:
+                    return self.UNAVAILABLE_MESSAGE
+
+        # Mistral is overloaded: race the retries against local Ollama, first good answer wins
+        pending = {
+            self._executor.submit(self._retry_mistral, messages, max_tokens): "mistral",
+            self._executor.submit(self.ollama.generate_response, context, query, max_tokens): "ollama",
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception:
+                    continue
+                if source == "ollama" and self._ollama_failed(result):
                     continue
-                # Non-retryable -> break to fallback
-                break
-        # Fallback to local Ollama if available
+                return result
+        return self.UNAVAILABLE_MESSAGE
+
+    def stream_response(self, context, query, max_tokens=150):
+        """
+        Yield normalized bullet lines as soon as each one is complete in the token stream
+        """
+        messages = self._build_messages(context, query)
+        emitted = 0
         try:
-            return self.ollama.generate_response(context, query, max_tokens=max_tokens)
+            stream = self.client.chat.stream(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=0.7
+            )
+            buffer = ""
+            for event in stream:
+                delta = event.data.choices[0].delta.content
+                if not isinstance(delta, str) or not delta:
+                    continue
+                buffer += delta
+                if "\n" not in buffer:
+                    continue
+                complete, buffer = buffer.rsplit("\n", 1)
+                for line in bullet_lines(complete):
+                    if emitted < self.MAX_BULLETS:
+                        emitted += 1
+                        yield line
+            for line in bullet_lines(buffer):
+                if emitted < self.MAX_BULLETS:
+                    emitted += 1
+                    yield line
         except Exception:
-            return "Unable to generate response right now. Please try again shortly."
+            if emitted:
+                return
+            # Nothing streamed yet: use the retrying / Ollama fallback path instead
+            for line in self.generate_response(context, query, max_tokens=max_tokens).splitlines():
+                yield line
 
     def generate_recommendations(self, question, answer_summary, kpis=None, charts=None, max_recs=4):
         """
         Generate concise, actionable recommendations tailored to the question and data.
         """
+        # Defaults so the fallback below still has a context if serialization itself fails
+        kpis_json = charts_json = "{}"
         try:
-            kpis = kpis or {}
-            charts = charts or {}
-            prompt = f"""
-You are an expert mining operations advisor. Based on the user's question, the assistant's answer, and the latest KPIs/charts, produce {max_recs} short, specific actions for managers. Avoid generic advice; ground each item in the provided data when possible.
-
-Question:
-{question}
-
-Assistant Answer (summary):
-{answer_summary}
-
-KPIs (JSON):
-{kpis}
-
-Charts (JSON - brief):
-{ {k: (v[:2] if isinstance(v, list) else v) for k, v in charts.items()} }
-
-Output format: plain list with one action per line, no numbering, each <= 20 words.
-"""
+            kpis_json = json_utils.dumps(kpis or {}).decode()
+            # Only the first couple of points per series are needed to ground the advice
+            charts_json = json_utils.dumps({
+                k: (v[:2] if isinstance(v, list) else v) for k, v in (charts or {}).items()
+            }).decode()
+            prompt = self._REC_TMPL.substitute(
+                max_recs=max_recs, question=question, answer=answer_summary,
+                kpis=kpis_json, charts=charts_json
+            )
 
             messages = [{"role": "user", "content": prompt}]
             response = self.client.chat.complete(
@@ -101,7 +203,7 @@ Output format: plain list with one action per line, no numbering, each <= 20 wor
             # Try local fallback for recommendations as well
             try:
                 fallback = self.ollama.generate_response(
-                    f"KPIs: {kpis}\nCharts: {charts}\nAnswer: {answer_summary}",
+                    self._REC_FALLBACK_TMPL.substitute(kpis=kpis_json, charts=charts_json, answer=answer_summary),
                     f"Give {max_recs} data-grounded actions for: {question}",
                     max_tokens=200
                 )
@@ -1,177 +1,536 @@
 from utils.langchain_setup import langchain_setup
 from utils.chromadb_manager import ChromaDBManager
 from database.db_config import get_mysql_connection
+from database.recent_events import RECENT_EVENTS_SQL, recent_events_ready
 from models.mistral_client import MistralService
 from models.tts_service import MultilingualTTS
+from utils.query_cache import SemanticQueryCache
+from utils.keyword_matcher import KeywordMatcher
+from utils.ttl_cache import ttl_cache
 from config import Config
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import copy
+import decimal
+import functools
 import logging
+import statistics
 
 logger = logging.getLogger(__name__)
 
+def _clip(value, maxw):
+    text = str(value)
+    return text if len(text) <= maxw else text[:maxw - 3] + "..."
+
+def _format_table(rows, limit=10, maxw=50):
+    """Right-aligned plain-text table of the first `limit` rows, cells clipped to `maxw` chars"""
+    rows = rows[:limit]
+    cols = list(rows[0].keys())
+    cells = [[_clip(r.get(c, ''), maxw) for c in cols] for r in rows]
+    widths = [max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(cols)]
+    lines = [" ".join(c.rjust(w) for c, w in zip(cols, widths))]
+    lines.extend(" ".join(v.rjust(w) for v, w in zip(row, widths)) for row in cells)
+    return "\n".join(lines)
+
+# Chart/KPI queries run concurrently, each on its own pooled connection
+_viz_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="viz")
+# Per-query fan-out (viz fetch, TTS). Kept apart from _viz_executor because the viz task
+# itself waits on chart futures, which could deadlock a shared pool
+_query_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="query")
+
+def _fetch_parallel(tasks):
+    """Run {name: fn()} tasks concurrently and return {name: result}"""
+    futures = {name: _viz_executor.submit(fn) for name, fn in tasks.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+def _borrows_connection(fn):
+    """Let a dashboard helper be called without `conn`; it then borrows a pooled one"""
+    @functools.wraps(fn)
+    def wrapper(self, conn=None):
+        if conn is not None:
+            return fn(self, conn)
+        conn = get_mysql_connection()
+        try:
+            return fn(self, conn)
+        finally:
+            conn.close()
+    return wrapper
+
+def _dashboard_cache(label, fallback):
+    """
+    Share a dashboard helper's result across requests for DASHBOARD_CACHE_TTL seconds.
+    There is one entry per helper (the connection is not part of the key), and cache
+    hits return before a connection is borrowed. Helpers raise on DB errors: the exception
+    skips the cache, is logged here and the caller gets `fallback()` instead, so a failed
+    query is retried on the next request rather than served for the whole TTL.
+    """
+    def decorator(fn):
+        cached = ttl_cache(Config.DASHBOARD_CACHE_TTL, key=lambda *args, **kwargs: fn.__name__)(_borrows_connection(fn))
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                return cached(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"❌ {label} error: {e}")
+                return fallback()
+
+        wrapper.invalidate = cached.invalidate
+        return wrapper
+    return decorator
+
+def _empty_kpis():
+    return {
+        "total_incidents": 0,
+        "critical_alerts": 0,
+        "avg_efficiency": 0,
+        "monthly_production": 0
+    }
+
+def _empty_equipment_status():
+    return [
+        {"status": "Critical", "count": 0},
+        {"status": "Operational", "count": 0},
+        {"status": "Maintenance", "count": 0}
+    ]
+
+def _fetch_rows(conn, sql):
+    """Run a small chart query and return its rows as dicts, DECIMAL columns as floats"""
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(sql)
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+    for row in rows:
+        for key, value in row.items():
+            if isinstance(value, decimal.Decimal):
+                row[key] = float(value)
+    return rows
+
+# Production rows for each (timeframe, site filtered?) shape, built once so every call sends
+# identical statement text and only the site name travels as a parameter
+_PRODUCTION_TIMEFRAMES = {
+    "last_month": "MONTH(metric_date) = MONTH(DATE_SUB(CURDATE(), INTERVAL 1 MONTH)) AND YEAR(metric_date) = YEAR(DATE_SUB(CURDATE(), INTERVAL 1 MONTH))",
+    "this_month": "MONTH(metric_date) = MONTH(CURDATE()) AND YEAR(metric_date) = YEAR(CURDATE())",
+    "last_30_days": "metric_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)",
+    "default": "metric_date >= DATE_SUB(CURDATE(), INTERVAL 180 DAY)",
+}
+_PRODUCTION_SQL = {
+    (timeframe, by_site): f"""
+        SELECT 
+            metric_date, 
+            site_name, 
+            material_type, 
+            quantity_tons, 
+            efficiency_percentage,
+            downtime_hours,
+            target_tons,
+            cost_per_ton
+        FROM production_metrics 
+        WHERE {where_sql}{" AND LOWER(site_name) = %s" if by_site else ""}
+        ORDER BY metric_date DESC, quantity_tons DESC 
+        LIMIT 50
+    """
+    for timeframe, where_sql in _PRODUCTION_TIMEFRAMES.items()
+    for by_site in (False, True)
+}
+
+# Response skeletons for the canned paths; callers copy and fill in language/answer/audio.
+# Nested containers are shared between copies and must not be mutated
+_GREETINGS = frozenset({"hi", "hii", "hello", "hlo", "hey", "hola"})
+_GREETING = {
+    "answer": "Hello! Ask about equipment status, production efficiency, safety incidents, or maintenance.",
+    "type": "greeting",
+    "visualizations": {},
+    "recommendations": [],
+    "sources": [],
+    "language": None,
+}
+_OFF_TOPIC = {
+    "answer": "Please ask a mining-related question (e.g., equipment status, production metrics, safety incidents).",
+    "type": "info",
+    "visualizations": {},
+    "recommendations": [],
+    "sources": [],
+    "language": None,
+}
+_ERROR = {
+    "answer": None,
+    "type": "error",
+    "visualizations": {},
+    "recommendations": [],
+    "sources": [],
+    "language": None,
+}
+
+class _KpiValues(dict):
+    """KPI mapping where values missing after a failed fetch read as 0"""
+    def __missing__(self, key):
+        return 0
+
 class RAGEngine:
+    # Keyword routing: every intent whose keywords occur in the lowercased question is a hit.
+    # Each routing decision has its own intent since the keyword lists differ per use site.
+    INTENTS = {
+        # Anything that looks mining/domain related (short off-topic input gets a canned reply)
+        "domain": frozenset({"equipment", "production", "incident", "safety", "maintenance",
+                             "efficiency", "mine", "vector", "chromadb", "alerts", "kpi"}),
+        # Chart filtering and recommendations
+        "trend": frozenset({"trend", "history", "over time"}),
+        "equipment": frozenset({"equipment", "machine", "status"}),
+        "production": frozenset({"production", "output", "efficiency"}),
+        "safety": frozenset({"safety", "incident", "accident"}),
+        # Which chart queries to run
+        "chart_efficiency": frozenset({"efficiency"}),
+        "chart_incidents": frozenset({"incident", "alerts"}),
+        "chart_production": frozenset({"production"}),
+        "chart_equipment": frozenset({"equipment", "status"}),
+        # SQL context routing
+        "sql_incidents": frozenset({"incident", "accident", "safety", "casualt", "injur"}),
+        "sql_equipment": frozenset({"equipment", "machine", "maintenance", "repair", "breakdown"}),
+        "sql_history": frozenset({"history", "past", "last", "previous"}),
+        "sql_production": frozenset({"production", "output", "tons", "efficiency", "downtime"}),
+        "sql_fuel": frozenset({"fuel", "energy", "consumption", "power"}),
+        "sql_quality": frozenset({"quality", "defect", "grade", "inspection"}),
+        "sql_compliance": frozenset({"safety", "compliance", "audit", "violation"}),
+        "last_month": frozenset({"last month"}),
+        "this_month": frozenset({"this month", "current month"}),
+        "last_30_days": frozenset({"last 30 days", "past 30 days"}),
+    }
+
+    GREETING_TEXT = _GREETING["answer"]
+
+    # KPI/chart helpers whose results are shared through the dashboard TTL cache
+    DASHBOARD_HELPERS = ("get_kpis", "get_incidents_trend", "get_equipment_status",
+                         "get_production_trend", "get_efficiency_trend")
+
     def __init__(self):
         self.chroma_manager = ChromaDBManager()
+        # Serve retrieval from an in-memory index; Chroma remains the persistent store
+        self.chroma_manager.build_vector_index()
         self.mistral = MistralService()
         self.tts = MultilingualTTS()
         # ✅ ADDED: Initialize LangChain prompt and components
         self.prompt = langchain_setup.create_custom_prompt()
         self.known_sites = {"mine a", "mine b", "mine c", "xi mine", "alpha mine", "beta mine"}
-        
+        # Near-duplicate questions reuse a prior result instead of re-running retrieval, LLM and TTS
+        self.query_cache = SemanticQueryCache(
+            capacity=Config.SEMANTIC_CACHE_SIZE,
+            threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+            ttl=Config.SEMANTIC_CACHE_TTL
+        )
+        try:
+            loaded = self.query_cache.load(Config.SEMANTIC_CACHE_PATH)
+            if loaded:
+                logger.info(f"✅ Restored {loaded} cached query results")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not restore query cache: {e}")
+        # Site names are matched in the same pass, as "site:<name>" intents
+        self._matcher = KeywordMatcher({
+            **self.INTENTS,
+            **{f"site:{site}": frozenset({site}) for site in self.known_sites}
+        })
+
+    def prewarm_tts(self):
+        """
+        Synthesize the fixed replies ahead of time so they are served from the TTS cache.
+        Starts a thread, so call it in the serving process (Gunicorn post_fork), not the master
+        """
+        return self.tts.prewarm([self.GREETING_TEXT, self.mistral.UNAVAILABLE_MESSAGE])
+
+    def invalidate_dashboard_cache(self):
+        """Drop cached KPI/chart results so the next request reads fresh data"""
+        for name in self.DASHBOARD_HELPERS:
+            getattr(RAGEngine, name).invalidate()
+
+    def match_intents(self, question):
+        """Set of INTENTS names matched by the question, found in one pass"""
+        return self._matcher.match(question.lower())
+
     def query(self, question, language='en'):
         """
         Returns structured response for chat interface
         """
         try:
-            # Normalize input once
-            q_lower = question.strip().lower()
-
-            # Handle simple greetings with a concise friendly response, NO KPIs/Charts/Recs
-            if q_lower in {"hi", "hii", "hello", "hlo", "hey", "hola"}:
-                answer_text = "Hello! Ask about equipment status, production efficiency, safety incidents, or maintenance."
-                audio_result = self.tts.text_to_speech(answer_text, language)
-                result = {
-                    "answer": answer_text,
-                    "type": "greeting",
-                    "visualizations": {},
-                    "recommendations": [],
-                    "sources": [],
-                    "language": language,
-                }
-                if audio_result.get("success"):
-                    result["audio"] = audio_result
-                return result
-
-            # If the query doesn't look mining/domain related, reply briefly without charts/recs
-            domain_keywords = [
-                "equipment", "production", "incident", "safety", "maintenance",
-                "efficiency", "mine", "vector", "chromadb", "alerts", "kpi"
-            ]
-            if len(q_lower.split()) < 3 and not any(k in q_lower for k in domain_keywords):
-                return {
-                    "answer": "Please ask a mining-related question (e.g., equipment status, production metrics, safety incidents).",
-                    "type": "info",
-                    "visualizations": {},
-                    "recommendations": [],
-                    "sources": [],
-                    "language": language,
-                }
+            hits = self.match_intents(question)
+            quick_reply = self._quick_reply(question, language, hits)
+            if quick_reply is not None:
+                return quick_reply
+
+            q_vec = self._embed_question(question)
+            cached = self._cached_result(q_vec, language, hits)
+            if cached is not None:
+                return cached
+
+            # Charts/KPIs don't depend on the answer: fetch them while retrieval and the LLM run
+            viz_future = _query_executor.submit(self.get_enhanced_visualization_data, question, hits)
 
             # 1. Vector Search + SQL Context + AI Answer (existing code)
-            relevant_docs = self.chroma_manager.similarity_search(question, k=Config.TOP_K_RESULTS)
-            sql_context = self.get_sql_context(question)
-            vector_context = "\n\n".join([doc.page_content for doc in relevant_docs])
-            full_context = f"{vector_context}\n\nDatabase Records:\n{sql_context}"
+            relevant_docs, sql_context, full_context = self._retrieve_context(question, q_vec, hits)
             answer = self.mistral.generate_response(full_context, question)
-            
-            # 2. Get Enhanced Visualization Data (dynamic based on query)
-            viz_data = self.get_enhanced_visualization_data(question)
-            
-            # 3. Generate Manager Recommendations with LLM using current data
-            recommendations = self.mistral.generate_recommendations(
-                question=question,
-                answer_summary=answer,
-                kpis=viz_data.get("kpis", {}),
-                charts=viz_data.get("charts", {}),
-                max_recs=4,
-            ) or self.generate_recommendations(question, answer, viz_data)
-            
-            # 4. Generate Audio (TTS)
-            audio_result = self.tts.text_to_speech(answer, language)
-            
-            result = {
-                "answer": answer,
-                "type": "ai_response",  # ✅ Identify response type
-                "visualizations": {
-                    "kpis": viz_data["kpis"],
-                    "charts": self.filter_relevant_charts(question, viz_data["charts"]),
-                    "tables": self.extract_data_tables(question, sql_context)
-                },
-                "recommendations": recommendations,
-                "sources": [doc.metadata for doc in relevant_docs],
-                "language": language
-            }
+
+            result = self._build_result(question, language, answer, relevant_docs, sql_context, hits, viz_future)
+            self._remember_result(q_vec, hits, result)
+            return result
+        except Exception as e:
+            logger.error(f"❌ RAG query error: {e}")
+            return self._error_result(e, language)
+
+    def stream_query(self, question, language='en'):
+        """
+        Streaming variant of query(): yields {"type": "bullet"} events while the answer
+        is generated and {"type": "audio"} events (speech for each bullet, in order) as soon
+        as they are synthesized, then a final {"type": "result"} event with the full
+        structured response. The result carries no whole-answer audio; the chunks replace it.
+        """
+        try:
+            hits = self.match_intents(question)
+            quick_reply = self._quick_reply(question, language, hits)
+            if quick_reply is not None:
+                yield {"type": "result", "response": quick_reply}
+                return
+
+            q_vec = self._embed_question(question)
+            cached = self._cached_result(q_vec, language, hits)
+            if cached is not None:
+                yield {"type": "result", "response": cached}
+                return
+
+            viz_future = _query_executor.submit(self.get_enhanced_visualization_data, question, hits)
+            relevant_docs, sql_context, full_context = self._retrieve_context(question, q_vec, hits)
+            bullets = []
+            pending = []  # (index, text, TTS future) in bullet order
+            for bullet in self.mistral.stream_response(full_context, question):
+                bullets.append(bullet)
+                yield {"type": "bullet", "text": bullet}
+                # Each bullet is spoken while the model keeps generating the next ones
+                speech = bullet.lstrip("-• ").strip()
+                if speech:
+                    pending.append((len(bullets) - 1, speech, _query_executor.submit(self.tts.text_to_speech, speech, language)))
+                while pending and pending[0][2].done():
+                    yield self._audio_event(*pending.pop(0))
+            answer = "\n".join(bullets) or self.mistral.UNAVAILABLE_MESSAGE
+
+            for item in pending:
+                yield self._audio_event(*item)
+
+            result = self._build_result(question, language, answer, relevant_docs, sql_context, hits, viz_future,
+                                        with_audio=False)
+            self._remember_result(q_vec, hits, result)
+            yield {"type": "result", "response": result}
+        except Exception as e:
+            logger.error(f"❌ RAG stream query error: {e}")
+            yield {"type": "result", "response": self._error_result(e, language)}
+
+    @staticmethod
+    def _audio_event(index, text, future):
+        audio = future.result()
+        if not audio.get("success"):
+            return {"type": "audio", "index": index, "text": text, "success": False}
+        return {"type": "audio", "index": index, "text": text, **audio}
+
+    def _quick_reply(self, question, language, hits):
+        """Short canned replies for greetings and off-topic input, or None"""
+        # Normalize input once
+        q_lower = question.strip().lower()
+
+        # Handle simple greetings with a concise friendly response, NO KPIs/Charts/Recs
+        if q_lower in _GREETINGS:
+            audio_result = self.tts.text_to_speech(self.GREETING_TEXT, language)
+            result = _GREETING.copy()
+            result["language"] = language
             if audio_result.get("success"):
                 result["audio"] = audio_result
-            
             return result
+
+        # If the query doesn't look mining/domain related, reply briefly without charts/recs
+        if len(q_lower.split()) < 3 and "domain" not in hits:
+            result = _OFF_TOPIC.copy()
+            result["language"] = language
+            return result
+        return None
+
+    def _embed_question(self, question):
+        """Embed the normalized question with the retrieval model, or None if unavailable"""
+        embeddings = self.chroma_manager.embeddings
+        if embeddings is None:
+            return None
+        try:
+            return embeddings.embed_query(question.strip().lower())
         except Exception as e:
-            logger.error(f"❌ RAG query error: {e}")
-            error_text = f"Error processing query: {str(e)}"
-            error_result = {
-                "answer": error_text,
-                "type": "error",
-                "visualizations": {},
-                "recommendations": [],
-                "sources": [],
-                "language": language
-            }
-            # Try to generate audio for error message too
-            try:
-                audio_result = self.tts.text_to_speech(error_text, language)
-                if audio_result.get("success"):
-                    error_result["audio"] = audio_result
-            except:
-                pass  # Audio not critical for errors
-            return error_result
-
-    def generate_recommendations(self, question, answer, viz_data):
-        """Generate actionable recommendations for managers"""
-        recommendations = []
+            logger.warning(f"⚠️ Query embedding for cache failed: {e}")
+            return None
+
+    @staticmethod
+    def _cache_tag(hits):
+        """
+        Exact-match part of the semantic cache key: the matched intents. Questions that differ
+        only in site or timeframe embed almost identically but route to different SQL and charts
+        """
+        return "|".join(sorted(hits))
+
+    def _cached_result(self, q_vec, language, hits):
+        """Copy of a cached result for a near-identical question, with audio redone for a new language"""
+        if q_vec is None:
+            return None
+        cached = self.query_cache.lookup(q_vec, tag=self._cache_tag(hits))
+        if cached is None:
+            return None
+        result = copy.deepcopy(cached)
+        # Streamed results are cached without whole-answer audio; synthesize it on reuse
+        if result.get("language") != language or "audio" not in result:
+            result["language"] = language
+            result.pop("audio", None)
+            audio_result = self.tts.text_to_speech(result["answer"], language)
+            if audio_result.get("success"):
+                result["audio"] = audio_result
+        return result
+
+    def _remember_result(self, q_vec, hits, result):
+        if q_vec is not None and result.get("type") != "error":
+            self.query_cache.add(q_vec, copy.deepcopy(result), tag=self._cache_tag(hits))
+
+    def register_query_cache_save(self):
+        """Save the query cache at exit; register in serving processes only, so the
+        preloaded master's startup snapshot never overwrites what the workers learned"""
+        atexit.register(self.save_query_cache)
+
+    def save_query_cache(self):
+        try:
+            self.query_cache.save(Config.SEMANTIC_CACHE_PATH)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not persist query cache: {e}")
+
+    def _retrieve_context(self, question, q_vec=None, hits=None):
+        """Vector search plus SQL records, combined into the LLM context"""
+        relevant_docs = self.chroma_manager.similarity_search(question, k=Config.TOP_K_RESULTS, query_vec=q_vec)
+        sql_context = self.get_sql_context(question, hits)
+        vector_context = "\n\n".join([doc.page_content for doc in relevant_docs])
+        full_context = f"{vector_context}\n\nDatabase Records:\n{sql_context}"
+        return relevant_docs, sql_context, full_context
+
+    def _build_result(self, question, language, answer, relevant_docs, sql_context, hits=None, viz_future=None,
+                      with_audio=True):
+        """Attach visualizations, recommendations and (unless with_audio=False) audio to a generated answer"""
+        if hits is None:
+            hits = self.match_intents(question)
+        # 2. Get Enhanced Visualization Data (dynamic based on query), possibly already in flight
+        if viz_future is not None:
+            viz_data = viz_future.result()
+        else:
+            viz_data = self.get_enhanced_visualization_data(question, hits)
         
-        # Analyze question context for specific recommendations
-        query_lower = question.lower()
+        # TTS only needs the answer, so it runs while recommendations are generated
+        tts_future = _query_executor.submit(self.tts.text_to_speech, answer, language) if with_audio else None
         
-        if any(word in query_lower for word in ['equipment', 'machine', 'status']):
-            critical_count = viz_data["kpis"].get("critical_alerts", 0)
-            if critical_count > 0:
-                recommendations.append(f"🚨 Immediate attention needed for {critical_count} critical equipment")
-                recommendations.append("Schedule maintenance for equipment with efficiency below 70%")
-                recommendations.append("Review equipment alerts in the maintenance dashboard")
+        # 3. Generate Manager Recommendations with LLM using current data
+        recommendations = self.mistral.generate_recommendations(
+            question=question,
+            answer_summary=answer,
+            kpis=viz_data.get("kpis", {}),
+            charts=viz_data.get("charts", {}),
+            max_recs=4,
+        ) or self.generate_recommendations(question, answer, viz_data, hits)
         
-        if any(word in query_lower for word in ['production', 'output', 'efficiency']):
-            efficiency = viz_data["kpis"].get("avg_efficiency", 0)
-            if efficiency < 80:
-                recommendations.append(f"📊 Production efficiency ({efficiency}%) below target - investigate bottlenecks")
-                recommendations.append("Optimize shift schedules to improve equipment utilization")
-            else:
-                recommendations.append(f"✅ Good production efficiency ({efficiency}%) - maintain current processes")
+        # 4. Generate Audio (TTS)
+        audio_result = tts_future.result() if tts_future is not None else {}
         
-        if any(word in query_lower for word in ['safety', 'incident', 'accident']):
-            incidents = viz_data["kpis"].get("total_incidents", 0)
-            if incidents > 0:
-                recommendations.append(f"⚠️ {incidents} safety incidents reported - review safety protocols")
-                recommendations.append("Conduct safety audit in high-risk areas")
-            else:
-                recommendations.append("✅ No recent safety incidents - continue current safety measures")
+        result = {
+            "answer": answer,
+            "type": "ai_response",  # ✅ Identify response type
+            "visualizations": {
+                "kpis": viz_data["kpis"],
+                "charts": self.filter_relevant_charts(question, viz_data["charts"], hits),
+                "tables": self.extract_data_tables(question, sql_context)
+            },
+            "recommendations": recommendations,
+            "sources": [doc.metadata for doc in relevant_docs],
+            "language": language
+        }
+        if audio_result.get("success"):
+            result["audio"] = audio_result
+        
+        return result
+
+    def _error_result(self, error, language):
+        error_text = f"Error processing query: {str(error)}"
+        error_result = _ERROR.copy()
+        error_result["answer"] = error_text
+        error_result["language"] = language
+        # Try to generate audio for error message too
+        try:
+            audio_result = self.tts.text_to_speech(error_text, language)
+            if audio_result.get("success"):
+                error_result["audio"] = audio_result
+        except:
+            pass  # Audio not critical for errors
+        return error_result
+
+    # Rule-based fallback recommendations: (intent, condition on KPIs, templates), in output order
+    _REC_RULES = (
+        ("equipment", lambda k: k["critical_alerts"] > 0, (
+            "🚨 Immediate attention needed for {critical_alerts} critical equipment",
+            "Schedule maintenance for equipment with efficiency below 70%",
+            "Review equipment alerts in the maintenance dashboard",
+        )),
+        ("production", lambda k: k["avg_efficiency"] < 80, (
+            "📊 Production efficiency ({avg_efficiency}%) below target - investigate bottlenecks",
+            "Optimize shift schedules to improve equipment utilization",
+        )),
+        ("production", lambda k: k["avg_efficiency"] >= 80, (
+            "✅ Good production efficiency ({avg_efficiency}%) - maintain current processes",
+        )),
+        ("safety", lambda k: k["total_incidents"] > 0, (
+            "⚠️ {total_incidents} safety incidents reported - review safety protocols",
+            "Conduct safety audit in high-risk areas",
+        )),
+        ("safety", lambda k: k["total_incidents"] == 0, (
+            "✅ No recent safety incidents - continue current safety measures",
+        )),
+    )
+    _DEFAULT_RECS = (
+        "Review weekly equipment maintenance schedules",
+        "Monitor production targets vs actual performance",
+        "Check safety compliance reports regularly",
+        "Optimize fuel consumption across all sites",
+    )
+
+    def generate_recommendations(self, question, answer, viz_data, hits=None):
+        """Generate actionable recommendations for managers"""
+        # Analyze question context for specific recommendations
+        if hits is None:
+            hits = self.match_intents(question)
+        
+        kpis = _KpiValues(viz_data["kpis"])
+        recommendations = []
+        for intent, condition, templates in self._REC_RULES:
+            if intent in hits and condition(kpis):
+                recommendations.extend(t.format_map(kpis) for t in templates)
         
         # Always add general recommendations
         if not recommendations:
-            recommendations = [
-                "Review weekly equipment maintenance schedules",
-                "Monitor production targets vs actual performance", 
-                "Check safety compliance reports regularly",
-                "Optimize fuel consumption across all sites"
-            ]
+            return list(self._DEFAULT_RECS)
         
         return recommendations[:4]  # Return top 4 recommendations
 
-    def filter_relevant_charts(self, question, charts_data):
+    def filter_relevant_charts(self, question, charts_data, hits=None):
         """Return only charts relevant to the question"""
-        query_lower = question.lower()
+        if hits is None:
+            hits = self.match_intents(question)
         relevant_charts = {}
         
-        if any(word in query_lower for word in ['trend', 'history', 'over time']):
+        if "trend" in hits:
             if "incidents_trend" in charts_data:
                 relevant_charts["incidents_trend"] = charts_data["incidents_trend"]
             if "production_metrics" in charts_data:
                 relevant_charts["production_trend"] = charts_data["production_metrics"]
         
-        if any(word in query_lower for word in ['equipment', 'machine', 'status']):
+        if "equipment" in hits:
             if "equipment_status" in charts_data:
                 relevant_charts["equipment_status"] = charts_data["equipment_status"]
         
-        if any(word in query_lower for word in ['production', 'output', 'efficiency']):
+        if "production" in hits:
             if "production_metrics" in charts_data:
                 relevant_charts["production_trend"] = charts_data["production_metrics"]
         
@@ -186,84 +545,70 @@ class RAGEngine:
             "preview": sql_context[:200] + "..." if len(sql_context) > 200 else sql_context
         }
 
-    def get_enhanced_visualization_data(self, query):
+    def get_enhanced_visualization_data(self, query, hits=None):
         """Get dynamic visualization data based on user query intent"""
         try:
-            conn = get_mysql_connection()
-            question = query.lower()
-            charts = {}
-
-            if "efficiency" in question:
-                charts["efficiency_trend"] = self.get_efficiency_trend(conn)
-            if "incident" in question or "alerts" in question:
-                charts["incidents_trend"] = self.get_incidents_trend(conn)
-            if "production" in question:
-                charts["production_metrics"] = self.get_production_trend(conn)
-            if "equipment" in question or "status" in question:
-                charts["equipment_status"] = self.get_equipment_status(conn)
+            if hits is None:
+                hits = self.match_intents(query)
+            chart_fns = {}
+
+            if "chart_efficiency" in hits:
+                chart_fns["efficiency_trend"] = self.get_efficiency_trend
+            if "chart_incidents" in hits:
+                chart_fns["incidents_trend"] = self.get_incidents_trend
+            if "chart_production" in hits:
+                chart_fns["production_metrics"] = self.get_production_trend
+            if "chart_equipment" in hits:
+                chart_fns["equipment_status"] = self.get_equipment_status
 
             # If no keywords matched, return all charts
-            if not charts:
-                charts = {
-                    "incidents_trend": self.get_incidents_trend(conn),
-                    "equipment_status": self.get_equipment_status(conn),
-                    "production_metrics": self.get_production_trend(conn),
-                    "efficiency_trend": self.get_efficiency_trend(conn)
+            if not chart_fns:
+                chart_fns = {
+                    "incidents_trend": self.get_incidents_trend,
+                    "equipment_status": self.get_equipment_status,
+                    "production_metrics": self.get_production_trend,
+                    "efficiency_trend": self.get_efficiency_trend
                 }
-            viz_data = {
-                "kpis": self.get_kpis(conn),
-                "charts": charts
+            results = _fetch_parallel({"kpis": self.get_kpis, **chart_fns})
+            kpis = results.pop("kpis")
+            return {
+                "kpis": kpis,
+                "charts": results
             }
-            conn.close()
-            return viz_data
         except Exception as e:
             logger.error(f"❌ Enhanced visualization data error: {e}")
             return {"kpis": {}, "charts": {}}
 
+    @_dashboard_cache("Efficiency trend", fallback=list)
     def get_efficiency_trend(self, conn):
         """Get efficiency trend data"""
-        try:
-            query = """
-                SELECT 
-                    DATE_FORMAT(metric_date, '%Y-%m') as month,
-                    AVG(efficiency_percentage) as avg_efficiency
-                FROM production_metrics
-                WHERE metric_date >= DATE_SUB(CURDATE(), INTERVAL 6 MONTH)
-                GROUP BY month
-                ORDER BY month DESC
-            """
-            return pd.read_sql(query, conn).to_dict(orient='records')
-        except Exception as e:
-            logger.error(f"❌ Efficiency trend error: {e}")
-            return []
+        query = """
+            SELECT 
+                DATE_FORMAT(metric_date, '%Y-%m') as month,
+                AVG(efficiency_percentage) as avg_efficiency
+            FROM production_metrics
+            WHERE metric_date >= DATE_SUB(CURDATE(), INTERVAL 6 MONTH)
+            GROUP BY month
+            ORDER BY month DESC
+        """
+        return _fetch_rows(conn, query)
 
-    def get_sql_context(self, query):
+    
+    def get_sql_context(self, query, hits=None):
         """Fetch relevant MySQL data with enhanced query routing"""
         conn = get_mysql_connection()
         cursor = conn.cursor(dictionary=True)
         
-        query_lower = query.lower()
+        if hits is None:
+            hits = self.match_intents(query)
         # Heuristic extraction of site and timeframe
-        site_filter = None
-        for token in query_lower.replace("?", " ").split():
-            # capture patterns like 'mine' followed by a word/letter
-            pass
-        for site in self.known_sites:
-            if site in query_lower:
-                site_filter = site
-                break
+        site_filter = min((h[len("site:"):] for h in hits if h.startswith("site:")), default=None)
         # Timeframe: last month / this month / last 30 days
-        timeframe = None
-        if "last month" in query_lower:
-            timeframe = "last_month"
-        elif "this month" in query_lower or "current month" in query_lower:
-            timeframe = "this_month"
-        elif "last 30 days" in query_lower or "past 30 days" in query_lower:
-            timeframe = "last_30_days"
+        timeframe = next((t for t in ("last_month", "this_month", "last_30_days") if t in hits), None)
         
         try:
             # Enhanced query routing with multiple conditions
-            if any(word in query_lower for word in ['incident', 'accident', 'safety', 'casualt', 'injur']):
+            if "sql_incidents" in hits:
                 cursor.execute("""
                     SELECT 
                         incident_date, 
@@ -288,9 +633,9 @@ class RAGEngine:
                     LIMIT 8
                 """)
                 
-            elif any(word in query_lower for word in ['equipment', 'machine', 'maintenance', 'repair', 'breakdown']):
+            elif "sql_equipment" in hits:
                 # Check if query is about maintenance history or current status
-                if any(word in query_lower for word in ['history', 'past', 'last', 'previous']):
+                if "sql_history" in hits:
                     cursor.execute("""
                         SELECT 
                             mr.equipment_id,
@@ -330,38 +675,11 @@ class RAGEngine:
                         LIMIT 8
                     """)
                     
-            elif any(word in query_lower for word in ['production', 'output', 'tons', 'efficiency', 'downtime']):
-                where_clauses = []
-                params = []
-                if timeframe == 'last_month':
-                    where_clauses.append("MONTH(metric_date) = MONTH(DATE_SUB(CURDATE(), INTERVAL 1 MONTH)) AND YEAR(metric_date) = YEAR(DATE_SUB(CURDATE(), INTERVAL 1 MONTH))")
-                elif timeframe == 'this_month':
-                    where_clauses.append("MONTH(metric_date) = MONTH(CURDATE()) AND YEAR(metric_date) = YEAR(CURDATE())")
-                elif timeframe == 'last_30_days':
-                    where_clauses.append("metric_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)")
-                else:
-                    where_clauses.append("metric_date >= DATE_SUB(CURDATE(), INTERVAL 180 DAY)")
-                if site_filter:
-                    where_clauses.append("LOWER(site_name) = %s")
-                    params.append(site_filter)
-                where_sql = " AND ".join(where_clauses)
-                cursor.execute(f"""
-                    SELECT 
-                        metric_date, 
-                        site_name, 
-                        material_type, 
-                        quantity_tons, 
-                        efficiency_percentage,
-                        downtime_hours,
-                        target_tons,
-                        cost_per_ton
-                    FROM production_metrics 
-                    WHERE {where_sql}
-                    ORDER BY metric_date DESC, quantity_tons DESC 
-                    LIMIT 50
-                """, tuple(params))
+            elif "sql_production" in hits:
+                sql = _PRODUCTION_SQL[(timeframe or "default", site_filter is not None)]
+                cursor.execute(sql, (site_filter,) if site_filter else ())
                 
-            elif any(word in query_lower for word in ['fuel', 'energy', 'consumption', 'power']):
+            elif "sql_fuel" in hits:
                 cursor.execute("""
                     SELECT 
                         equipment_id,
@@ -375,7 +693,7 @@ class RAGEngine:
                     LIMIT 6
                 """)
                 
-            elif any(word in query_lower for word in ['quality', 'defect', 'grade', 'inspection']):
+            elif "sql_quality" in hits:
                 cursor.execute("""
                     SELECT 
                         site_name,
@@ -389,7 +707,7 @@ class RAGEngine:
                     LIMIT 6
                 """)
                 
-            elif any(word in query_lower for word in ['safety', 'compliance', 'audit', 'violation']):
+            elif "sql_compliance" in hits:
                 cursor.execute("""
                     SELECT 
                         audit_date,
@@ -403,6 +721,9 @@ class RAGEngine:
                     LIMIT 5
                 """)
                 
+            elif recent_events_ready():
+                # Default: latest incidents/equipment/production from the trigger-maintained summary
+                cursor.execute(RECENT_EVENTS_SQL)
             else:
                 # Default: mixed context from multiple tables
                 cursor.execute("""
@@ -448,23 +769,24 @@ class RAGEngine:
             
             # Format results for better readability and grounding
             if results:
-                df = pd.DataFrame(results)
+                columns = results[0].keys()
                 # Build a concise textual summary with top-level stats
                 summary_lines = [f"Retrieved {len(results)} records from database."]
-                if 'site_name' in df.columns:
-                    sites = ", ".join(sorted(set(df['site_name'].dropna().astype(str)))[0:5])
+                if 'site_name' in columns:
+                    sites = ", ".join(sorted({str(r['site_name']) for r in results if r['site_name'] is not None})[0:5])
                     if sites:
                         summary_lines.append(f"Sites: {sites}")
-                if {'quantity_tons','efficiency_percentage','downtime_hours'}.issubset(df.columns):
+                if {'quantity_tons','efficiency_percentage','downtime_hours'}.issubset(columns):
                     try:
-                        total_qty = float(df['quantity_tons'].fillna(0).sum())
-                        avg_eff = float(df['efficiency_percentage'].dropna().astype(float).mean()) if not df['efficiency_percentage'].dropna().empty else 0.0
-                        total_down = float(df['downtime_hours'].fillna(0).sum())
+                        total_qty = sum(float(r['quantity_tons'] or 0) for r in results)
+                        effs = [float(r['efficiency_percentage']) for r in results if r['efficiency_percentage'] is not None]
+                        avg_eff = statistics.fmean(effs) if effs else 0.0
+                        total_down = sum(float(r['downtime_hours'] or 0) for r in results)
                         summary_lines.append(f"Total production: {total_qty:.0f} tons; Avg efficiency: {avg_eff:.1f}%; Downtime: {total_down:.1f} hrs")
                     except Exception:
                         pass
                 summary = "\n".join(summary_lines) + "\n\n"
-                return summary + df.head(10).to_string(index=False, max_colwidth=50)
+                return summary + _format_table(results)
             else:
                 return "No relevant data found in database for this query."
                 
@@ -479,123 +801,99 @@ class RAGEngine:
     def get_visualization_data(self, query):
         """Get data for charts and KPIs"""
         try:
-            conn = get_mysql_connection()
-            
-            viz_data = {
-                "kpis": self.get_kpis(conn),
-                "charts": {
-                    "incidents_trend": self.get_incidents_trend(conn),
-                    "equipment_status": self.get_equipment_status(conn),
-                    "production_metrics": self.get_production_trend(conn)
-                }
+            results = _fetch_parallel({
+                "kpis": self.get_kpis,
+                "incidents_trend": self.get_incidents_trend,
+                "equipment_status": self.get_equipment_status,
+                "production_metrics": self.get_production_trend
+            })
+            kpis = results.pop("kpis")
+            return {
+                "kpis": kpis,
+                "charts": results
             }
-            
-            conn.close()
-            return viz_data
         except Exception as e:
             logger.error(f"❌ Visualization data error: {e}")
             return {"kpis": {}, "charts": {}}
     
+    @_dashboard_cache("KPI calculation", fallback=_empty_kpis)
     def get_kpis(self, conn):
         """Calculate KPIs"""
+        cursor = conn.cursor(dictionary=True)
         try:
-            cursor = conn.cursor(dictionary=True)
-            
-            # Total incidents
-            cursor.execute("SELECT COUNT(*) as total_incidents FROM mining_incidents")
-            total_incidents = cursor.fetchone()['total_incidents']
-            
-            # Critical alerts
-            cursor.execute("SELECT COUNT(*) as critical_alerts FROM equipment_monitoring WHERE status='Critical'")
-            critical_alerts = cursor.fetchone()['critical_alerts']
-            
-            # Average efficiency (ignore NULL/0)
-            cursor.execute("SELECT AVG(NULLIF(efficiency_percentage, 0)) as avg_efficiency FROM production_metrics")
-            avg_efficiency = cursor.fetchone()['avg_efficiency'] or 0
-            
-            # Monthly production (current month) to match UI label
-            cursor.execute("SELECT SUM(quantity_tons) as monthly_production FROM production_metrics WHERE MONTH(metric_date)=MONTH(CURDATE()) AND YEAR(metric_date)=YEAR(CURDATE())")
-            monthly_production = cursor.fetchone()['monthly_production'] or 0
-            
-            # Also compute total production (not shown in UI but useful)
-            cursor.execute("SELECT SUM(quantity_tons) as total_production FROM production_metrics")
-            total_production = cursor.fetchone()['total_production'] or 0
-            
+            # One round-trip; the production aggregates share a single scan of production_metrics.
+            # Average efficiency ignores NULL/0, monthly production is the current month (matches UI label)
+            cursor.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM mining_incidents) AS total_incidents,
+                    (SELECT COUNT(*) FROM equipment_monitoring WHERE status='Critical') AS critical_alerts,
+                    p.avg_efficiency,
+                    p.monthly_production,
+                    p.total_production
+                FROM (
+                    SELECT
+                        AVG(NULLIF(efficiency_percentage, 0)) AS avg_efficiency,
+                        SUM(CASE WHEN MONTH(metric_date)=MONTH(CURDATE()) AND YEAR(metric_date)=YEAR(CURDATE())
+                                 THEN quantity_tons END) AS monthly_production,
+                        SUM(quantity_tons) AS total_production
+                    FROM production_metrics
+                ) p
+            """)
+            row = cursor.fetchone()
+        finally:
             cursor.close()
-            
-            return {
-                "total_incidents": total_incidents,
-                "critical_alerts": critical_alerts,
-                "avg_efficiency": round(float(avg_efficiency), 1),
-                "monthly_production": float(monthly_production),
-                "total_production": float(total_production)
-            }
-        except Exception as e:
-            logger.error(f"❌ KPI calculation error: {e}")
-            return {
-                "total_incidents": 0,
-                "critical_alerts": 0,
-                "avg_efficiency": 0,
-                "monthly_production": 0
-            }
+        
+        total_incidents = row['total_incidents']
+        critical_alerts = row['critical_alerts']
+        avg_efficiency = row['avg_efficiency'] or 0
+        monthly_production = row['monthly_production'] or 0
+        total_production = row['total_production'] or 0
+        
+        return {
+            "total_incidents": total_incidents,
+            "critical_alerts": critical_alerts,
+            "avg_efficiency": round(float(avg_efficiency), 1),
+            "monthly_production": float(monthly_production),
+            "total_production": float(total_production)
+        }
     
+    @_dashboard_cache("Incidents trend", fallback=list)
     def get_incidents_trend(self, conn):
         """Get incident trend data"""
-        try:
-            query = """
-                SELECT 
-                    DATE_FORMAT(incident_date, '%Y-%m') as month,
-                    severity,
-                    COUNT(*) as count
-                FROM mining_incidents
-                GROUP BY month, severity
-                ORDER BY month DESC
-            """
-            return pd.read_sql(query, conn).to_dict(orient='records')
-        except Exception as e:
-            logger.error(f"❌ Incidents trend error: {e}")
-            return []
+        query = """
+            SELECT 
+                DATE_FORMAT(incident_date, '%Y-%m') as month,
+                severity,
+                COUNT(*) as count
+            FROM mining_incidents
+            GROUP BY month, severity
+            ORDER BY month DESC
+        """
+        return _fetch_rows(conn, query)
     
+    @_dashboard_cache("Equipment status", fallback=_empty_equipment_status)
     def get_equipment_status(self, conn):
         """Get equipment status distribution, with a robust output for chart"""
-        try:
-            query = """
-                SELECT status, COUNT(*) as count
-                FROM equipment_monitoring
-                GROUP BY status
-            """
-            rows = pd.read_sql(query, conn).to_dict(orient='records')
-            # Ensure all expected statuses are represented, even if count is zero
-            expected_statuses = ["Critical", "Operational", "Maintenance"]
-            result = []
-            for status in expected_statuses:
-                match = next((r for r in rows if r['status'] == status), None)
-                result.append({
-                    "status": status,
-                    "count": int(match["count"]) if match else 0
-                })
-            return result
-        except Exception as e:
-            logger.error(f"❌ Equipment status error: {e}")
-            return [
-                {"status": "Critical", "count": 0},
-                {"status": "Operational", "count": 0},
-                {"status": "Maintenance", "count": 0}
-            ]
+        query = """
+            SELECT status, COUNT(*) as count
+            FROM equipment_monitoring
+            GROUP BY status
+        """
+        counts = {r['status']: int(r['count']) for r in _fetch_rows(conn, query)}
+        # Ensure all expected statuses are represented, even if count is zero
+        expected_statuses = ["Critical", "Operational", "Maintenance"]
+        return [{"status": status, "count": counts.get(status, 0)} for status in expected_statuses]
     
+    @_dashboard_cache("Production trend", fallback=list)
     def get_production_trend(self, conn):
         """Get production trend"""
-        try:
-            query = """
-                SELECT 
-                    DATE_FORMAT(metric_date, '%Y-%m') as month,
-                    SUM(quantity_tons) as production,
-                    AVG(NULLIF(efficiency_percentage,0)) as efficiency
-                FROM production_metrics
-                GROUP BY month
-                ORDER BY month DESC
-            """
-            return pd.read_sql(query, conn).to_dict(orient='records')
-        except Exception as e:
-            logger.error(f"❌ Production trend error: {e}")
-            return []
\ No newline at end of file
+        query = """
+            SELECT 
+                DATE_FORMAT(metric_date, '%Y-%m') as month,
+                SUM(quantity_tons) as production,
+                AVG(NULLIF(efficiency_percentage,0)) as efficiency
+            FROM production_metrics
+            GROUP BY month
+            ORDER BY month DESC
+        """
+        return _fetch_rows(conn, query)
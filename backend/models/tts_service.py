@@ -1,12 +1,74 @@
 from gtts import gTTS
 from deep_translator import GoogleTranslator
 import base64
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from config import Config
+from utils.query_cache import LRUCache
 import logging
 
 logger = logging.getLogger(__name__)
 
+try:
+    from piper import PiperVoice
+except ImportError:  # optional: local synthesis, gTTS is used without it
+    PiperVoice = None
+
+# Sentence-level synthesis for text_to_speech_stream
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_stream_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tts")
+
+# Synthesized audio keyed by (text hash, language): memory first, then cache/tts/{lang}/{hash}.{fmt}
+_TTS_CACHE = LRUCache(maxsize=Config.TTS_CACHE_SIZE)
+
+def _load_voices(languages):
+    """Load PIPER_VOICES_DIR/{lang}.onnx (+ .onnx.json config) once for every language that has one"""
+    voices = {}
+    if PiperVoice is None or not os.path.isdir(Config.PIPER_VOICES_DIR):
+        return voices
+    for language in languages:
+        model_path = os.path.join(Config.PIPER_VOICES_DIR, f"{language}.onnx")
+        if not os.path.exists(model_path):
+            continue
+        try:
+            voices[language] = PiperVoice.load(model_path)
+            logger.info(f"✅ Piper voice loaded for {language}")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load Piper voice for {language}: {e}")
+    return voices
+
+def _cache_key(text, language):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest(), language
+
+def _disk_path(key, fmt):
+    digest, language = key
+    return os.path.join(Config.TTS_CACHE_DIR, language, f"{digest}.{fmt}")
+
+def _read_disk(key, fmt):
+    try:
+        with open(_disk_path(key, fmt), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _write_disk(key, fmt, audio_bytes):
+    """Write via a temp file + rename so readers never see a partial file"""
+    path = _disk_path(key, fmt)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio_bytes)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"⚠️ Could not write TTS cache file: {e}")
+
 class MultilingualTTS:
     # Map language codes to gTTS supported codes
     LANGUAGE_MAP = {
@@ -19,6 +81,36 @@ class MultilingualTTS:
         'ar': 'ar',
         'pt': 'pt'
     }
+
+    # Local Piper voices by language; languages without one are synthesized with gTTS.
+    # Loaded on first use in each process, so a preloading Gunicorn master never forks
+    # its ONNX Runtime sessions into the workers
+    _voices = {}
+    _voices_pid = None
+    _voices_lock = threading.Lock()
+
+    @staticmethod
+    def _get_voices():
+        if MultilingualTTS._voices_pid != os.getpid():
+            with MultilingualTTS._voices_lock:
+                if MultilingualTTS._voices_pid != os.getpid():
+                    MultilingualTTS._voices = _load_voices(MultilingualTTS.LANGUAGE_MAP)
+                    MultilingualTTS._voices_pid = os.getpid()
+        return MultilingualTTS._voices
+
+    # One GoogleTranslator per (thread, language): translate() stores the query on the
+    # instance, so a translator shared across the streaming TTS workers would mix up requests
+    _translators = threading.local()
+
+    @staticmethod
+    def _translator(language):
+        cache = getattr(MultilingualTTS._translators, "by_lang", None)
+        if cache is None:
+            cache = MultilingualTTS._translators.by_lang = {}
+        translator = cache.get(language)
+        if translator is None:
+            translator = cache[language] = GoogleTranslator(source='en', target=language)
+        return translator
     
     @staticmethod
     def text_to_speech(text, language='en'):
@@ -29,43 +121,107 @@ class MultilingualTTS:
             if not text or not text.strip():
                 return {"success": False, "error": "Empty text"}
             
-            # Get gTTS language code
-            gtts_lang = MultilingualTTS.LANGUAGE_MAP.get(language, 'en')
-            
-            # Translate if not English (only if translation service available)
-            translated_text = text
-            if language != 'en':
-                try:
-                    translator = GoogleTranslator(source='en', target=language)
-                    translated_text = translator.translate(text)
-                    logger.info(f"✅ Translated to {language}: {translated_text[:50]}...")
-                except Exception as trans_error:
-                    logger.warning(f"⚠️ Translation failed, using original text: {trans_error}")
-                    translated_text = text  # Fallback to original
-            
-            # Generate speech with gTTS
-            tts = gTTS(text=translated_text, lang=gtts_lang, slow=False)
-            
-            # Convert to base64
-            audio_buffer = BytesIO()
-            tts.write_to_fp(audio_buffer)
-            audio_buffer.seek(0)
+            key = _cache_key(text, language)
+            fmt = "wav" if language in MultilingualTTS._get_voices() else "mp3"
+            cached = _TTS_CACHE.get(key)
+            if cached is None:
+                audio_bytes = _read_disk(key, fmt)
+                if audio_bytes is not None:
+                    cached = MultilingualTTS._result(audio_bytes, language, fmt)
+                    _TTS_CACHE.put(key, cached)
+            if cached is not None:
+                return dict(cached)
             
-            audio_base64 = base64.b64encode(audio_buffer.read()).decode('utf-8')
+            audio_bytes, translated = MultilingualTTS._synthesize(text, language)
+            result = MultilingualTTS._result(audio_bytes, language, fmt)
+            # Untranslated fallback audio is not cached so a later call can retry the translation
+            if translated:
+                _TTS_CACHE.put(key, result)
+                _write_disk(key, fmt, audio_bytes)
             
             logger.info(f"✅ Audio generated successfully for language: {language}")
-            return {
-                "success": True,
-                "audio_base64": audio_base64,
-                "language": language,
-                "format": "mp3"
-            }
+            return dict(result)
         except Exception as e:
             logger.error(f"❌ TTS error: {e}")
             return {
                 "success": False,
                 "error": str(e)
             }
+
+    @staticmethod
+    def text_to_speech_stream(text, language='en'):
+        """
+        Split text into sentences (and bullet lines), synthesize them concurrently and
+        yield one audio chunk dict per sentence, in order, as soon as each is ready
+        """
+        sentences = [s.strip() for s in _SENTENCE_RE.split(text or "") if s.strip()]
+        futures = [_stream_executor.submit(MultilingualTTS.text_to_speech, s, language) for s in sentences]
+        for index, (sentence, future) in enumerate(zip(sentences, futures)):
+            yield {"index": index, "text": sentence, **future.result()}
+
+    @staticmethod
+    def _synthesize(text, language):
+        """
+        Translate (if needed) and synthesize with the local Piper voice (WAV) or gTTS (MP3).
+        Returns (audio bytes, whether translation succeeded).
+        """
+        # Answers are generated in English, so non-English voices still need translated text
+        # (only if translation service available)
+        translated_text = text
+        translated = True
+        # English and one-character strings (bullet markers, digits) need no translation
+        if language != 'en' and len(text.strip()) >= 2:
+            try:
+                translated_text = MultilingualTTS._translator(language).translate(text)
+                logger.info(f"✅ Translated to {language}: {translated_text[:50]}...")
+            except Exception as trans_error:
+                logger.warning(f"⚠️ Translation failed, using original text: {trans_error}")
+                translated_text = text  # Fallback to original
+                translated = False
+        
+        voice = MultilingualTTS._get_voices().get(language)
+        if voice is not None:
+            return MultilingualTTS._piper_wav(voice, translated_text), translated
+        
+        # Generate speech with gTTS
+        gtts_lang = MultilingualTTS.LANGUAGE_MAP.get(language, 'en')
+        tts = gTTS(text=translated_text, lang=gtts_lang, slow=False)
+        audio_buffer = BytesIO()
+        tts.write_to_fp(audio_buffer)
+        return audio_buffer.getvalue(), translated
+
+    @staticmethod
+    def _piper_wav(voice, text):
+        buf = BytesIO()
+        with wave.open(buf, "wb") as wav_file:
+            # piper-tts >= 1.3 renamed the WAV writer to synthesize_wav
+            synthesize = getattr(voice, "synthesize_wav", None) or voice.synthesize
+            synthesize(text, wav_file)
+        return buf.getvalue()
+
+    @staticmethod
+    def _result(audio_bytes, language, fmt):
+        # Base64-encoded once, when the entry is created
+        return {
+            "success": True,
+            "audio_base64": base64.b64encode(audio_bytes).decode('utf-8'),
+            "language": language,
+            "format": fmt
+        }
+
+    @staticmethod
+    def prewarm(texts, languages=None):
+        """Synthesize fixed messages for every language in a background thread"""
+        languages = languages or list(Config.SUPPORTED_LANGUAGES)
+
+        def _run():
+            for language in languages:
+                for text in texts:
+                    MultilingualTTS.text_to_speech(text, language)
+
+        thread = threading.Thread(target=_run, name="tts-prewarm", daemon=True)
+        thread.start()
+        return thread
     
     @staticmethod
     def get_supported_languages():
@@ -0,0 +1,28 @@
+import os
+import sys
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def export_quantized_embeddings(model_name=Config.EMBEDDING_MODEL, output_dir=Config.ONNX_EMBEDDING_DIR):
+    """
+    Export the embedding model to ONNX and apply int8 dynamic quantization.
+    Requires: pip install optimum[exporters] onnxruntime
+    Then run the backend with EMBEDDING_BACKEND=onnx.
+    """
+    from utils.onnx_embeddings import export_onnx_model
+
+    print(f"📦 Exporting {model_name} to ONNX in {output_dir} and quantizing weights to int8...")
+    int8_path = os.path.join(output_dir, export_onnx_model(model_name, output_dir, Config.ONNX_EMBEDDING_FILE))
+
+    print(f"✅ Quantized model written to {int8_path}")
+
+if __name__ == "__main__":
+    export_quantized_embeddings()
@@ -1,9 +1,12 @@
 # utils/__init__.py
 from .chromadb_manager import ChromaDBManager
 from .langchain_setup import LangChainSetup, langchain_setup
+from .embed_cache import EmbeddingCache, CachedEmbeddings
 
 __all__ = [
     'ChromaDBManager',
     'LangChainSetup',
-    'langchain_setup'
+    'langchain_setup',
+    'EmbeddingCache',
+    'CachedEmbeddings'
 ]
@@ -4,14 +4,145 @@ from langchain_community.vectorstores import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from utils.langchain_setup import langchain_setup
+from utils.embed_cache import EmbeddingCache, CachedEmbeddings
+from utils.vector_index import VectorIndex
+from utils.parallel_embeddings import ParallelEmbeddings
 from config import Config
+import atexit
+import codecs
+import hashlib
 import logging
-import pandas as pd
 import os
+import queue
+import threading
+import uuid
+from io import BytesIO
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+
+try:
+    from charset_normalizer import from_bytes
+except ImportError:  # optional: non-UTF-8 uploads then read as latin-1
+    from_bytes = None
 
 logger = logging.getLogger(__name__)
 
+
+class _CsvReadError(Exception):
+    """Raised when the CSV itself can't be parsed/decoded (as opposed to embedding or insert failures)"""
+
+
+# Upload types that ask for the document type to be inferred from the CSV's columns
+GENERIC_DOC_TYPES = frozenset({"csv", "document", "", None})
+# First signature whose columns are all present wins; anything else is a generic "document"
+DOC_TYPE_SIGNATURES = [
+    (frozenset({"equipment_id", "status"}), "equipment"),
+    (frozenset({"efficiency_score"}), "equipment"),
+    (frozenset({"incident_date", "incident_type"}), "incidents"),
+    (frozenset({"metric_date", "quantity_tons"}), "production"),
+    (frozenset({"audit_date", "compliance_score"}), "safety"),
+    (frozenset({"maintenance_type", "start_date"}), "maintenance"),
+]
+
+
+def _cell_text(column, default):
+    """A column as text, with empty cells shown as the field's default (row[col] or default)"""
+    column = column.astype(str)
+    return column.mask(column == "", str(default))
+
+
+# Row text per CSV document type: a header line, then one "<label><value><suffix>" line per field.
+# Fields are (label, column, default used when the column is missing, suffix)
+TEMPLATES = {
+    "equipment": ("Equipment Monitoring:", [
+        ("ID: ", "equipment_id", "N/A", ""),
+        ("Type: ", "equipment_type", "N/A", ""),
+        ("Status: ", "status", "N/A", ""),
+        ("Efficiency: ", "efficiency_score", "N/A", "%"),
+        ("Alerts: ", "alerts", "None", ""),
+        ("Last Maintenance: ", "last_maintenance", "N/A", ""),
+        ("Temperature: ", "temperature_celsius", "N/A", "°C"),
+        ("Vibration: ", "vibration_level", "N/A", ""),
+    ]),
+    "incidents": ("Mining Incident:", [
+        ("Date: ", "incident_date", "N/A", ""),
+        ("Mine: ", "mine_name", "N/A", ""),
+        ("Type: ", "incident_type", "N/A", ""),
+        ("Severity: ", "severity", "N/A", ""),
+        ("Description: ", "description", "N/A", ""),
+        ("Casualties: ", "casualties", 0, ""),
+        ("Injuries: ", "injuries", 0, ""),
+        ("Cost Impact: $", "cost_impact", 0, ""),
+    ]),
+    "production": ("Production Metrics:", [
+        ("Date: ", "metric_date", "N/A", ""),
+        ("Site: ", "site_name", "N/A", ""),
+        ("Material: ", "material_type", "N/A", ""),
+        ("Quantity: ", "quantity_tons", 0, " tons"),
+        ("Target: ", "target_tons", 0, " tons"),
+        ("Efficiency: ", "efficiency_percentage", 0, "%"),
+        ("Downtime: ", "downtime_hours", 0, " hours"),
+        ("Cost per Ton: $", "cost_per_ton", 0, ""),
+    ]),
+    "safety": ("Safety Compliance:", [
+        ("Audit Date: ", "audit_date", "N/A", ""),
+        ("Site: ", "site_name", "N/A", ""),
+        ("Compliance Score: ", "compliance_score", 0, "%"),
+        ("Violations: ", "violations", 0, ""),
+        ("Recommendations: ", "recommendations", "None", ""),
+    ]),
+    "maintenance": ("Maintenance Record:", [
+        ("Equipment: ", "equipment_id", "N/A", ""),
+        ("Type: ", "maintenance_type", "N/A", ""),
+        ("Start: ", "start_date", "N/A", ""),
+        ("End: ", "end_date", "N/A", ""),
+        ("Cost: $", "cost", 0, ""),
+        ("Downtime: ", "downtime_hours", 0, " hours"),
+    ]),
+    "fuel": ("Fuel & Energy:", [
+        ("Equipment: ", "equipment_id", "N/A", ""),
+        ("Date: ", "reading_date", "N/A", ""),
+        ("Fuel: ", "fuel_liters", 0, " liters"),
+        ("Energy: ", "energy_kwh", 0, " kWh"),
+        ("Shift: ", "shift", "N/A", ""),
+    ]),
+    "quality": ("Quality Metrics:", [
+        ("Site: ", "site_name", "N/A", ""),
+        ("Date: ", "metric_date", "N/A", ""),
+        ("Material: ", "material_type", "N/A", ""),
+        ("Grade: ", "quality_grade", "N/A", ""),
+        ("Defects: ", "defects_found", 0, ""),
+    ]),
+}
+
 class ChromaDBManager:
+    # CSV ingestion streams the file: CSV_BLOCK_BYTES per parsed block (CSV_STREAM_ROWS rows
+    # without pyarrow), CSV_BATCH_ROWS rows per queued batch, at most CSV_QUEUE_DEPTH batches queued
+    CSV_BLOCK_BYTES = 8 << 20
+    CSV_STREAM_ROWS = 50000
+    CSV_BATCH_ROWS = 1000
+    CSV_QUEUE_DEPTH = 4
+    # Chunks embedded and inserted per vectorstore call inside add_documents
+    INSERT_BATCH = 256
+    # Rows per collection.add call in _raw_add
+    RAW_ADD_BATCH = 1000
+    # Split chunks shorter than MIN_CHUNK are merged into a neighbour up to MAX_MERGED_CHUNK chars
+    MIN_CHUNK = 100
+    MAX_MERGED_CHUNK = 1150
+    # Embeddings are normalized, so cosine is the natural metric. Chroma only applies the
+    # hnsw:* settings when it creates the collection
+    COLLECTION_METADATA = {
+        "description": "Mining Knowledge Base",
+        "hnsw:space": "cosine",
+        "hnsw:M": 32,
+        "hnsw:construction_ef": 200,
+        "hnsw:search_ef": 64,
+    }
+
     def __init__(self, embeddings=None):
         """Initialize ChromaDB manager with LOCAL storage"""
         try:
@@ -20,29 +151,50 @@ class ChromaDBManager:
 
             # ✅ Reuse already-initialized embeddings from langchain_setup to avoid extra downloads
             self.embeddings = embeddings if embeddings is not None else getattr(langchain_setup, 'embeddings', None)
+            self.embed_cache = None
+            # start_index lets _merge_tiny rebuild merged chunks from the source text
+            self._splitter = RecursiveCharacterTextSplitter(
+                chunk_size=Config.CHUNK_SIZE,
+                chunk_overlap=Config.CHUNK_OVERLAP,
+                add_start_index=True
+            )
+            # LangChain Chroma wrapper, built once on first use (see the vectorstore property)
+            self._vectorstore = None
+            self._vectorstore_embeddings = None
+            # Populated by build_vector_index(); until then searches go through Chroma
+            self.vector_index = VectorIndex(
+                backend=Config.VECTOR_INDEX_BACKEND,
+                hnsw_threshold=Config.VECTOR_INDEX_HNSW_THRESHOLD,
+                precision=Config.VECTOR_INDEX_PRECISION
+            )
+            self._index_ready = False
+            # Worker-process embedder for large CSV uploads, started on first use
+            self._parallel_embeddings = None
+            # True once the on-disk client is open (see reopen)
+            self._persistent = False
             
             # ✅ Use LOCAL persistent storage instead of server
             self.client = chromadb.PersistentClient(
                 path="./chroma_data"  # Local directory to store data
             )
             
-            # ✅ Create or get collection
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"description": "Mining Knowledge Base"}
-            )
+            # ✅ Create or get collection (cosine HNSW, see COLLECTION_METADATA)
+            self.collection = self._open_collection()
+            self._persistent = True
 
             logger.info(f"✅ Connected to ChromaDB (Local): {self.collection_name}")
+
+            try:
+                self.embed_cache = EmbeddingCache(Config.EMBED_CACHE_PATH, Config.EMBEDDING_MODEL)
+            except Exception as cache_err:
+                logger.warning(f"⚠️ Embedding cache unavailable: {cache_err}")
         
         except Exception as e:
             logger.error(f"❌ ChromaDB initialization failed: {e}")
             # Fallback: try ephemeral client (in-memory)
             try:
                 self.client = chromadb.EphemeralClient()
-                self.collection = self.client.get_or_create_collection(
-                    name=self.collection_name,
-                    metadata={"description": "Mining Knowledge Base"}
-                )
+                self.collection = self._open_collection()
                 logger.info(f"✅ Connected to ChromaDB (In-Memory): {self.collection_name}")
             except Exception as e2:
                 logger.error(f"❌ ChromaDB fallback also failed: {e2}")
@@ -50,8 +202,57 @@ class ChromaDBManager:
                 self.collection = None
                 self.embeddings = None
     
-    def add_documents(self, documents):
-        """Add documents to ChromaDB with embeddings"""
+    def reopen(self):
+        """
+        Reconnect the persistent Chroma client in a forked worker: its SQLite handles were
+        opened by the preloading master and must not be used across fork()
+        """
+        # The in-memory fallback has no files; the worker keeps its copy of the data
+        if self.client is None or not getattr(self, "_persistent", False):
+            return
+        try:
+            from chromadb.api.client import SharedSystemClient
+            # PersistentClient reuses a cached System per path; drop the one inherited from the master
+            SharedSystemClient.clear_system_cache()
+            self.client = chromadb.PersistentClient(path="./chroma_data")
+            self.collection = self._open_collection()
+            self._vectorstore = None
+            logger.info(f"✅ Reconnected to ChromaDB in worker {os.getpid()}")
+        except Exception as e:
+            logger.error(f"❌ ChromaDB reconnect failed: {e}")
+
+    def _open_collection(self):
+        """Get or create the knowledge-base collection with the HNSW settings above"""
+        try:
+            collection = self.client.get_or_create_collection(
+                name=self.collection_name,
+                metadata=self.COLLECTION_METADATA
+            )
+        except ValueError:
+            # Chroma refuses to change the distance function of an existing collection
+            collection = self.client.get_collection(name=self.collection_name)
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        if space != self.COLLECTION_METADATA["hnsw:space"]:
+            logger.warning(f"⚠️ Collection {self.collection_name} was created with {space} distance; "
+                           "recreate it to use cosine HNSW settings")
+        return collection
+
+    @property
+    def vectorstore(self):
+        """Cached LangChain Chroma wrapper, rebuilt if the embeddings object is swapped"""
+        vectorstore = getattr(self, "_vectorstore", None)
+        if vectorstore is None or self._vectorstore_embeddings is not self.embeddings:
+            vectorstore = Chroma(
+                client=self.client,
+                collection_name=self.collection_name,
+                embedding_function=self._cached(self.embeddings)
+            )
+            self._vectorstore = vectorstore
+            self._vectorstore_embeddings = self.embeddings
+        return vectorstore
+
+    def add_documents(self, documents, split=True):
+        """Add documents to ChromaDB with embeddings (split=False stores them unchunked)"""
         if not self.client or not self.collection:
             logger.error("ChromaDB not initialized")
             return False
@@ -60,22 +261,16 @@ class ChromaDBManager:
             return False
         
         try:
-            # Split large documents into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200
-            )
-            
-            chunks = text_splitter.split_documents(documents)
-            
-            # Add to ChromaDB with provided embedding function
-            vectorstore = Chroma(
-                client=self.client,
-                collection_name=self.collection_name,
-                embedding_function=self.embeddings
-            )
+            chunks = self._split_documents(documents, split)
             
-            vectorstore.add_documents(chunks)
+            # Add to ChromaDB with provided embedding function, in bounded batches
+            for start in range(0, len(chunks), self.INSERT_BATCH):
+                ids = self.vectorstore.add_documents(chunks[start:start + self.INSERT_BATCH])
+                if self._index_ready and ids:
+                    added = self.collection.get(ids=ids, include=["embeddings", "documents", "metadatas"])
+                    self.vector_index.add(added["embeddings"], added["documents"], added["metadatas"])
+            if self._index_ready and chunks:
+                self._save_vector_index()
             logger.info(f"✅ Added {len(chunks)} document chunks to ChromaDB")
             return True
             
@@ -83,169 +278,332 @@ class ChromaDBManager:
             logger.error(f"❌ Failed to add documents: {e}")
             return False
     
-    def add_csv_data(self, csv_file_path, document_type):
-        """Load data from CSV files and add to ChromaDB"""
+    def add_documents_cached(self, documents, split=True):
+        """Add documents, reusing cached embeddings for chunks that were embedded before"""
+        if not self.client or not self.collection:
+            logger.error("ChromaDB not initialized")
+            return False
+        if not self.embeddings:
+            logger.warning("⚠️ Embeddings not available; skipping add_documents to avoid downloads")
+            return False
+
+        try:
+            chunks = self._split_documents(documents, split)
+            if not chunks:
+                return True
+            # Split chunks can share a row_id, so they keep random ids
+            self._raw_add(chunks, ids=[str(uuid.uuid4()) for _ in chunks])
+            if self._index_ready:
+                self._save_vector_index()
+            logger.info(f"✅ Added {len(chunks)} document chunks to ChromaDB")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Failed to add documents: {e}")
+            return False
+
+    def _split_documents(self, documents, split=True):
+        """Chunk documents longer than CHUNK_SIZE; shorter ones (e.g. CSV rows) pass through untouched"""
+        if not split or all(len(d.page_content) <= Config.CHUNK_SIZE for d in documents):
+            return list(documents)
+        chunks = []
+        for doc in documents:
+            if len(doc.page_content) <= Config.CHUNK_SIZE:
+                chunks.append(doc)
+            else:
+                chunks.extend(self._merge_tiny(doc.page_content, self._splitter.split_documents([doc])))
+        return chunks
+
+    def _merge_tiny(self, text, chunks):
+        """
+        Fold chunks shorter than MIN_CHUNK into their neighbour while the merged span of `text`
+        stays within MAX_MERGED_CHUNK, so a document's leftover tail doesn't cost its own vector
+        """
+        merged = []
+        for chunk in chunks:
+            start = chunk.metadata.get("start_index", -1)
+            if merged and start >= 0:
+                prev = merged[-1]
+                prev_start = prev.metadata.get("start_index", -1)
+                end = start + len(chunk.page_content)
+                tiny = min(len(prev.page_content), len(chunk.page_content)) < self.MIN_CHUNK
+                if tiny and prev_start >= 0 and end - prev_start <= self.MAX_MERGED_CHUNK:
+                    # Slice the source rather than concatenating, so the overlap isn't duplicated
+                    prev.page_content = text[prev_start:end]
+                    continue
+            merged.append(chunk)
+        for chunk in merged:
+            chunk.metadata.pop("start_index", None)
+        return merged
+
+    def _raw_add(self, documents, embeddings=None, ids=None, embed=None):
+        """
+        Insert documents straight into the collection with precomputed embeddings,
+        bypassing the LangChain wrapper. Embeds them first (with `embed`, default
+        self.embeddings.embed_documents) unless `embeddings` is given.
+        Ids already in the collection are skipped; returns how many were written.
+        The caller persists the in-memory index.
+        """
+        texts = [d.page_content for d in documents]
+        metadatas = [d.metadata for d in documents]
+        if ids is None:
+            ids = [self._document_id(m, t) for m, t in zip(metadatas, texts)]
+        embed = embed or self._cached(self.embeddings).embed_documents
+        written = 0
+        for start in range(0, len(texts), self.RAW_ADD_BATCH):
+            stop = start + self.RAW_ADD_BATCH
+            # Content-derived ids: a row that is already stored is unchanged, so don't re-embed it
+            existing = set(self.collection.get(ids=ids[start:stop], include=[])["ids"])
+            keep = [i for i in range(start, min(stop, len(texts))) if ids[i] not in existing]
+            if not keep:
+                continue
+            batch_texts = [texts[i] for i in keep]
+            batch_metadatas = [metadatas[i] for i in keep]
+            if embeddings is None:
+                batch_embeddings = embed(batch_texts)
+            else:
+                batch_embeddings = [embeddings[i] for i in keep]
+            self.collection.upsert(
+                ids=[ids[i] for i in keep],
+                embeddings=batch_embeddings,
+                documents=batch_texts,
+                metadatas=batch_metadatas
+            )
+            if self._index_ready:
+                self.vector_index.add(batch_embeddings, batch_texts, batch_metadatas)
+            written += len(keep)
+        return written
+
+    def ingest_parallel(self, documents):
+        """_raw_add with the embedding pass spread over worker processes (falls back to in-process)"""
+        embedder = self._get_parallel_embeddings()
+        return self._raw_add(documents, embed=self._cached(embedder).embed_documents if embedder else None)
+
+    def _cached(self, embeddings):
+        """`embeddings` behind the persistent embedding cache, when that is available"""
+        if self.embed_cache is None:
+            return embeddings
+        return CachedEmbeddings(embeddings, self.embed_cache)
+
+    def _get_parallel_embeddings(self):
+        """Worker-process embedder, or None when it can't help (ONNX backend, GPU, 1 process)"""
+        if self._parallel_embeddings is None:
+            model = getattr(self.embeddings, "model", None)
+            if Config.EMBED_PROCESSES <= 1 or model is None or str(getattr(model, "device", "cpu")) != "cpu":
+                return None
+            self._parallel_embeddings = ParallelEmbeddings(Config.EMBEDDING_MODEL, Config.EMBED_PROCESSES)
+            atexit.register(self._parallel_embeddings.close)
+        return self._parallel_embeddings
+
+    @staticmethod
+    def _document_id(metadata, text):
+        """Stable id from source, row and content, so re-ingesting an unchanged row is a no-op"""
+        if "source" not in metadata or "row_id" not in metadata:
+            return str(uuid.uuid4())
+        return hashlib.sha1(f"{metadata['source']}|{metadata['row_id']}|{text}".encode("utf-8")).hexdigest()
+
+    def add_csv_data(self, csv_file_path, document_type, source_name=None):
+        """Load data from a CSV file path (or raw CSV bytes) and add to ChromaDB"""
+        is_bytes = isinstance(csv_file_path, (bytes, bytearray))
+        source_name = source_name or ("upload.csv" if is_bytes else os.path.basename(csv_file_path))
+        if not self.client or not self.collection:
+            logger.error("ChromaDB not initialized")
+            return False
+        if not self.embeddings:
+            logger.warning("⚠️ Embeddings not available; skipping CSV load to avoid downloads")
+            return False
         try:
-            # Read CSV file with robust fallbacks
-            df = None
+            # Sniff the encoding from a small sample; latin-1 stays as the last resort for garbage bytes.
+            # Rows ingested before a decode error are skipped on the retry (content-derived ids)
+            result = None
             read_errors = []
-            for enc in ("utf-8", "utf-8-sig", "latin-1"):
+            encoding = self._detect_encoding(csv_file_path)
+            for enc in dict.fromkeys((encoding, "latin-1")):
                 try:
-                    df = pd.read_csv(csv_file_path, encoding=enc, dtype=object)
+                    source = BytesIO(csv_file_path) if is_bytes else csv_file_path
+                    result = self._ingest_csv(source, enc, document_type, source_name)
                     break
-                except Exception as re:
+                except _CsvReadError as re:
                     read_errors.append(str(re))
-            if df is None or df.empty:
-                logger.warning(f"⚠️ CSV appears empty or unreadable: {csv_file_path}. Errors: {' | '.join(read_errors)}")
+            if result is None:
+                logger.warning(f"⚠️ CSV appears empty or unreadable: {source_name}. Errors: {' | '.join(read_errors)}")
                 return False
 
-            # Normalize column names
-            df.columns = [str(c).strip().lower() for c in df.columns]
-            df = df.fillna("")
-
-            # Auto-infer document type if generic
-            inferred_doc_type = document_type
-            if document_type in ("csv", "document", "", None):
-                cols = set(df.columns)
-                if {"equipment_id", "status"}.issubset(cols) or "efficiency_score" in cols:
-                    inferred_doc_type = "equipment"
-                elif {"incident_date", "incident_type"}.issubset(cols):
-                    inferred_doc_type = "incidents"
-                elif {"metric_date", "quantity_tons"}.issubset(cols):
-                    inferred_doc_type = "production"
-                elif {"audit_date", "compliance_score"}.issubset(cols):
-                    inferred_doc_type = "safety"
-                elif {"maintenance_type", "start_date"}.issubset(cols):
-                    inferred_doc_type = "maintenance"
-                else:
-                    inferred_doc_type = "document"
-
-            documents = []
-            created = 0
-            # Convert each row to a document (skip rows that produce empty text)
-            for idx, row in df.iterrows():
-                try:
-                    content = self._row_to_text(row, inferred_doc_type).strip()
-                    if not content:
-                        continue
-                    doc = Document(
-                        page_content=content,
-                        metadata={
-                            "source": os.path.basename(csv_file_path),
-                            "type": inferred_doc_type,
-                            "row_id": int(idx)
-                        }
-                    )
-                    documents.append(doc)
-                    created += 1
-                except Exception as row_err:
-                    logger.warning(f"⚠️ Skipping bad row {idx}: {row_err}")
-
-            if not documents:
-                logger.warning(f"⚠️ No usable rows found in {csv_file_path}")
+            inferred_doc_type, created, written = result
+            if not created:
+                logger.warning(f"⚠️ No usable rows found in {source_name}")
                 return False
+            if self._index_ready and written:
+                self._save_vector_index()
 
-            # Add to ChromaDB
-            success = self.add_documents(documents)
-            if success:
-                logger.info(f"✅ Added {created} documents from {csv_file_path} (type={inferred_doc_type})")
-                return True
-            else:
-                return False
+            logger.info(
+                f"✅ Added {written} documents from {source_name} (type={inferred_doc_type}, "
+                f"{created - written} unchanged)"
+            )
+            return True
                 
         except Exception as e:
-            logger.error(f"❌ Failed to load CSV {csv_file_path}: {e}")
+            logger.error(f"❌ Failed to load CSV {source_name}: {e}")
             return False
+
+    def _ingest_csv(self, source, encoding, document_type, source_name):
+        """
+        Streaming CSV ingestion: a reader thread parses and templates the file block by block
+        and hands row batches through a bounded queue to this thread, which embeds and inserts
+        them. Peak memory stays at a few blocks whatever the file size.
+        Returns (doc_type, rows queued, rows written); reader failures raise _CsvReadError.
+        """
+        batches = queue.Queue(maxsize=self.CSV_QUEUE_DEPTH)
+        stop = threading.Event()
+        doc_type = document_type
+
+        def put(item):
+            # Back-pressure: wait for the embedder, but give up once it has stopped
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+
+        def read():
+            nonlocal doc_type
+            try:
+                offset = 0
+                for n, df in enumerate(self._iter_csv_frames(source, encoding)):
+                    # The embedder has stopped (error or shutdown): stop parsing the rest of the file
+                    if stop.is_set():
+                        break
+                    # Normalize column names
+                    df.columns = [str(c).strip().lower() for c in df.columns]
+                    df = df.fillna("")
+                    if n == 0:
+                        doc_type = self._infer_doc_type(document_type, df.columns)
+                    contents = self._rows_to_text(df, doc_type)
+                    for start in range(0, len(contents), self.CSV_BATCH_ROWS):
+                        if stop.is_set():
+                            break
+                        # Skip rows that produce empty text
+                        documents = [
+                            Document(
+                                page_content=content,
+                                metadata={
+                                    "source": source_name,
+                                    "type": doc_type,
+                                    "row_id": offset + start + i
+                                }
+                            )
+                            for i, content in enumerate(contents[start:start + self.CSV_BATCH_ROWS])
+                            if content.strip()
+                        ]
+                        if documents:
+                            put(documents)
+                    offset += len(df)
+                put(None)
+            except Exception as e:
+                put(_CsvReadError(e))
+
+        reader = threading.Thread(target=read, name="csv-reader", daemon=True)
+        reader.start()
+        created = written = 0
+        try:
+            while True:
+                documents = batches.get()
+                if documents is None:
+                    break
+                if isinstance(documents, _CsvReadError):
+                    raise documents
+                # Files big enough to be worth it are embedded across worker processes
+                add = self._raw_add
+                if created + len(documents) >= Config.PARALLEL_EMBED_MIN_ROWS and self._get_parallel_embeddings():
+                    add = self.ingest_parallel
+                # One row is one short document: no splitting, no LangChain wrapper
+                written += add(documents)
+                created += len(documents)
+        finally:
+            stop.set()
+            reader.join()
+        return doc_type, created, written
+
+    @staticmethod
+    def _infer_doc_type(document_type, columns):
+        """Auto-infer the document type from the columns when the upload's type is generic"""
+        if document_type not in GENERIC_DOC_TYPES:
+            return document_type
+        cols = frozenset(columns)
+        return next((doc_type for signature, doc_type in DOC_TYPE_SIGNATURES if signature <= cols), "document")
     
-    def _row_to_text(self, row, doc_type):
-        """Convert CSV row to meaningful text content"""
-        if doc_type == "equipment":
-            return f"""
-            Equipment Monitoring:
-            ID: {row.get('equipment_id', 'N/A')}
-            Type: {row.get('equipment_type', 'N/A')}
-            Status: {row.get('status', 'N/A')}
-            Efficiency: {row.get('efficiency_score', 'N/A')}%
-            Alerts: {row.get('alerts', 'None')}
-            Last Maintenance: {row.get('last_maintenance', 'N/A')}
-            Temperature: {row.get('temperature_celsius', 'N/A')}°C
-            Vibration: {row.get('vibration_level', 'N/A')}
-            """
-        
-        elif doc_type == "incidents":
-            return f"""
-            Mining Incident:
-            Date: {row.get('incident_date', 'N/A')}
-            Mine: {row.get('mine_name', 'N/A')}
-            Type: {row.get('incident_type', 'N/A')}
-            Severity: {row.get('severity', 'N/A')}
-            Description: {row.get('description', 'N/A')}
-            Casualties: {row.get('casualties', 0)}
-            Injuries: {row.get('injuries', 0)}
-            Cost Impact: ${row.get('cost_impact', 0)}
-            """
-        
-        elif doc_type == "production":
-            return f"""
-            Production Metrics:
-            Date: {row.get('metric_date', 'N/A')}
-            Site: {row.get('site_name', 'N/A')}
-            Material: {row.get('material_type', 'N/A')}
-            Quantity: {row.get('quantity_tons', 0)} tons
-            Target: {row.get('target_tons', 0)} tons
-            Efficiency: {row.get('efficiency_percentage', 0)}%
-            Downtime: {row.get('downtime_hours', 0)} hours
-            Cost per Ton: ${row.get('cost_per_ton', 0)}
-            """
-        
-        elif doc_type == "safety":
-            return f"""
-            Safety Compliance:
-            Audit Date: {row.get('audit_date', 'N/A')}
-            Site: {row.get('site_name', 'N/A')}
-            Compliance Score: {row.get('compliance_score', 0)}%
-            Violations: {row.get('violations', 0)}
-            Recommendations: {row.get('recommendations', 'None')}
-            """
-        
-        elif doc_type == "maintenance":
-            return f"""
-            Maintenance Record:
-            Equipment: {row.get('equipment_id', 'N/A')}
-            Type: {row.get('maintenance_type', 'N/A')}
-            Start: {row.get('start_date', 'N/A')}
-            End: {row.get('end_date', 'N/A')}
-            Cost: ${row.get('cost', 0)}
-            Downtime: {row.get('downtime_hours', 0)} hours
-            """
-        
-        elif doc_type == "fuel":
-            return f"""
-            Fuel & Energy:
-            Equipment: {row.get('equipment_id', 'N/A')}
-            Date: {row.get('reading_date', 'N/A')}
-            Fuel: {row.get('fuel_liters', 0)} liters
-            Energy: {row.get('energy_kwh', 0)} kWh
-            Shift: {row.get('shift', 'N/A')}
-            """
-        
-        elif doc_type == "quality":
-            return f"""
-            Quality Metrics:
-            Site: {row.get('site_name', 'N/A')}
-            Date: {row.get('metric_date', 'N/A')}
-            Material: {row.get('material_type', 'N/A')}
-            Grade: {row.get('quality_grade', 'N/A')}
-            Defects: {row.get('defects_found', 0)}
-            """
-        
+    @staticmethod
+    def _detect_encoding(source, sample_size=32 * 1024):
+        """Guess a CSV's encoding from its first 32KB (BOM, then UTF-8, then charset-normalizer)"""
+        if isinstance(source, (bytes, bytearray)):
+            sample = bytes(source[:sample_size])
         else:
-            # Generic fallback - convert all columns to text
-            content_parts = [f"{col}: {row.get(col, 'N/A')}" for col in row.index]
-            return "\n".join(content_parts)
+            with open(source, "rb") as f:
+                sample = f.read(sample_size)
+        if sample.startswith(codecs.BOM_UTF8):
+            return "utf-8-sig"
+        if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return "utf-16"
+        try:
+            sample.decode("utf-8")
+            return "utf-8"
+        except UnicodeDecodeError as e:
+            # The sample may end in the middle of a multi-byte character
+            if len(sample) == sample_size and e.start >= len(sample) - 3:
+                return "utf-8"
+        if from_bytes is not None:
+            best = from_bytes(sample).best()
+            if best is not None:
+                return best.encoding
+        return "latin-1"
+
+    def _iter_csv_frames(self, source, encoding):
+        """
+        Yield the CSV as DataFrames of every column as text, one block at a time
+        (pyarrow's streaming reader when available, else pandas in chunks)
+        """
+        if pa is None:
+            import pandas as pd  # ingestion only; kept out of server startup
+            yield from pd.read_csv(source, encoding=encoding, dtype=object, chunksize=self.CSV_STREAM_ROWS)
+            return
+        read_options = pa_csv.ReadOptions(encoding=encoding, block_size=self.CSV_BLOCK_BYTES)
+        # Keep the semantics of dtype=object by declaring every column a string up front:
+        # cells keep their exact text ("007", "1.50") instead of round-tripping through
+        # inferred ints/floats, and empty cells read as "" rather than null
+        names = pa_csv.open_csv(source, read_options=read_options).schema.names
+        if hasattr(source, "seek"):
+            source.seek(0)
+        reader = pa_csv.open_csv(
+            source,
+            read_options=read_options,
+            convert_options=pa_csv.ConvertOptions(column_types={name: pa.string() for name in names})
+        )
+        for batch in reader:
+            yield batch.to_pandas()
     
-    def similarity_search(self, query, k=5):
-        """Perform semantic search with embeddings"""
+    @staticmethod
+    def _rows_to_text(df, doc_type):
+        """Render every row as text column-wise (Series concatenation, no per-row Python)"""
+        if doc_type in TEMPLATES:
+            header, fields = TEMPLATES[doc_type]
+            # Missing columns read as their default, like row.get(col, default) did
+            for _, col, default, _ in fields:
+                if col not in df.columns:
+                    df[col] = default
+        else:
+            # Generic fallback - convert all columns to text
+            header, fields = None, [(f"{col}: ", col, "N/A", "") for col in df.columns]
+        if not fields:
+            return [""] * len(df)
+        lines = [label + _cell_text(df[col], default) + suffix for label, col, default, suffix in fields]
+        content = lines[0].str.cat(lines[1:], sep="\n")
+        if header:
+            content = header + "\n" + content
+        return content.tolist()
+
+    def similarity_search(self, query, k=5, query_vec=None):
+        """Perform semantic search with embeddings (`query_vec` skips re-embedding the query)"""
         if not self.client or not self.collection:
             logger.warning("⚠️ ChromaDB not initialized, returning empty results")
             return []
@@ -254,16 +612,44 @@ class ChromaDBManager:
             return []
         
         try:
-            vectorstore = Chroma(
-                client=self.client,
-                collection_name=self.collection_name,
-                embedding_function=self.embeddings
-            )
-            return vectorstore.similarity_search(query, k=k)
+            if query_vec is None:
+                query_vec = self.embeddings.embed_query(query)
+            if self._index_ready and len(self.vector_index):
+                hits = self.vector_index.search(query_vec, k=k)
+                return [Document(page_content=text, metadata=meta) for text, meta, _ in hits]
+
+            return self.vectorstore.similarity_search_by_vector(list(map(float, query_vec)), k=k)
         except Exception as e:
             logger.error(f"❌ Similarity search failed: {e}")
             return []
     
+    def build_vector_index(self):
+        """Load all stored vectors into the in-memory index used by similarity_search"""
+        if not self.collection or not self.vector_index.available:
+            return False
+        try:
+            # A saved index is reused only if it still matches the collection
+            try:
+                loaded = self.vector_index.load(Config.VECTOR_INDEX_PATH, expected_count=self.collection.count())
+            except Exception as e:
+                logger.warning(f"⚠️ Saved vector index unreadable, rebuilding from the collection: {e}")
+                loaded = False
+            if not loaded:
+                self.vector_index.load_from_collection(self.collection)
+                self._save_vector_index()
+            self._index_ready = True
+            return True
+        except Exception as e:
+            logger.error(f"❌ Failed to build in-memory vector index: {e}")
+            self._index_ready = False
+            return False
+    
+    def _save_vector_index(self):
+        try:
+            self.vector_index.save(Config.VECTOR_INDEX_PATH)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not persist vector index: {e}")
+
     def get_collection_info(self):
         """Get information about the collection"""
         if not self.collection:
@@ -0,0 +1,109 @@
+import sqlite3
+import threading
+import hashlib
+import logging
+import os
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by (sha256(text), model), backed by SQLite"""
+
+    # Stay well below SQLite's host-parameter limit for bulk lookups
+    _SELECT_BATCH = 500
+
+    def __init__(self, path, model_name):
+        self.path = path
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # SQLite connections must not cross fork(): each process opens its own on first use
+        self._conn = None
+        self._conn_pid = None
+        with self._lock:
+            self._connection().execute(
+                "CREATE TABLE IF NOT EXISTS emb ("
+                "hash TEXT NOT NULL, model TEXT NOT NULL, vec BLOB NOT NULL, "
+                "PRIMARY KEY (hash, model))"
+            )
+            self._conn.commit()
+
+    def _connection(self):
+        # Caller holds self._lock
+        if self._conn_pid != os.getpid():
+            # A connection inherited from the parent is dropped unused, never closed here
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def hash_text(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, hashes, model=None):
+        """Return {hash: float32 vector} for every hash already cached (under `model`, default model_name)"""
+        model = model or self.model_name
+        found = {}
+        hashes = list(dict.fromkeys(hashes))
+        with self._lock:
+            for i in range(0, len(hashes), self._SELECT_BATCH):
+                batch = hashes[i:i + self._SELECT_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection().execute(
+                    f"SELECT hash, vec FROM emb WHERE model = ? AND hash IN ({placeholders})",
+                    (model, *batch)
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put(self, items, model=None):
+        """Store an iterable of (hash, vector) pairs (under `model`, default model_name)"""
+        model = model or self.model_name
+        rows = [
+            (h, model, np.asarray(vec, dtype=np.float32).tobytes())
+            for h, vec in items
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._connection().executemany("INSERT OR REPLACE INTO emb (hash, model, vec) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+
+class CachedEmbeddings:
+    """
+    Embeddings wrapper whose embed_documents only encodes texts missing from an EmbeddingCache
+    and stores the new vectors; queries and any other attribute go straight to the wrapped model.
+    Vectors are filed under the wrapped object's `cache_key` (backend, precision and model, e.g.
+    "onnx:minilm-onnx/model_int8.onnx"), so different numerics for one model never mix
+    """
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = getattr(embeddings, "cache_key", None) or cache.model_name
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        hashes = [EmbeddingCache.hash_text(t) for t in texts]
+        cached = self.cache.get(hashes, model=self.model)
+
+        # Only embed the texts we have never seen before, in one batched call
+        missing = list(dict.fromkeys(h for h in hashes if h not in cached))
+        if missing:
+            text_by_hash = dict(zip(hashes, texts))
+            vectors = self.embeddings.embed_documents([text_by_hash[h] for h in missing])
+            fresh = {h: np.asarray(vec, dtype=np.float32) for h, vec in zip(missing, vectors)}
+            self.cache.put(fresh.items(), model=self.model)
+            cached.update(fresh)
+        return [cached[h].tolist() for h in hashes]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def __getattr__(self, name):
+        return getattr(self.embeddings, name)
@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+def write_atomic(path, write):
+    """
+    Call write(f) on a unique temp file next to `path`, then rename it into place, so
+    readers never see a partial file and concurrent writers never share a temp file
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,51 @@
+import sqlite3
+import time
+import os
+
+class JobStore:
+    """
+    Ingestion job status in SQLite, so every Gunicorn worker can answer status polls
+    for jobs started by any other worker
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, filename TEXT, status TEXT NOT NULL, "
+                "error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # One short-lived connection per call: safe across threads and forked workers
+        return sqlite3.connect(self.path, timeout=10)
+
+    def create(self, job_id, filename):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, filename, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, filename, now, now)
+            )
+
+    def update(self, job_id, status, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id)
+            )
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, filename, status, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "filename", "status", "error", "created_at", "updated_at")
+        return dict(zip(keys, row))
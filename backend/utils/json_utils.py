@@ -0,0 +1,33 @@
+import decimal
+import datetime
+import orjson
+from werkzeug.http import http_date
+
+def _default(obj):
+    """
+    Types orjson does not serialize natively (mostly MySQL driver values).
+    Decimals and dates are encoded as Flask's jsonify does (string, RFC 822 date),
+    so the frontend sees the same wire format from every endpoint.
+    """
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, datetime.date):
+        return http_date(obj)
+    if isinstance(obj, datetime.time):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj):
+    """Serialize to UTF-8 JSON bytes with orjson"""
+    # Dates go through _default rather than orjson's ISO 8601 encoder
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY)
+
+def loads(data):
+    """Parse JSON bytes or str with orjson"""
+    return orjson.loads(data)
@@ -0,0 +1,45 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import ahocorasick
+except ImportError:  # optional: fall back to per-keyword substring checks
+    ahocorasick = None
+
+
+class KeywordMatcher:
+    """
+    Maps text to the set of intents whose keywords occur in it (plain substring semantics).
+    With pyahocorasick installed all keywords are found in a single pass over the text.
+    """
+
+    def __init__(self, intents):
+        # A keyword may belong to several intents, so each one carries a tuple of intent names
+        owners = {}
+        for intent, keywords in intents.items():
+            for keyword in keywords:
+                owners.setdefault(keyword, set()).add(intent)
+        self._owners = {keyword: tuple(sorted(names)) for keyword, names in owners.items()}
+
+        self._automaton = None
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for keyword, names in self._owners.items():
+                automaton.add_word(keyword, names)
+            automaton.make_automaton()
+            self._automaton = automaton
+        else:
+            logger.info("ℹ️ pyahocorasick not installed; using substring keyword matching")
+
+    def match(self, text):
+        """Return the set of intents with at least one keyword in `text` (expected lowercase)"""
+        hits = set()
+        if self._automaton is not None:
+            for _, names in self._automaton.iter(text):
+                hits.update(names)
+        else:
+            for keyword, names in self._owners.items():
+                if keyword in text:
+                    hits.update(names)
+        return hits
@@ -9,33 +9,72 @@ import logging
 logger = logging.getLogger(__name__)
 
 class LangChainSetup:
+    DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
     def __init__(self):
         """Initialize LangChain components"""
         self.embeddings = None
         self.vector_store = None
         self.qa_chain = None
+        # Built on first request and shared afterwards (both are stateless)
+        self._prompt = None
+        self._splitter = None
         self.initialize_components()
     
     def initialize_components(self):
         """Initialize all LangChain components"""
+        backend = Config.EMBEDDING_BACKEND
+        if backend in ("onnx", "auto") and self._init_onnx_embeddings(required=backend == "onnx"):
+            return
         try:
+            self._configure_torch_threads()
             from sentence_transformers import SentenceTransformer
             # Load model directly without HuggingFaceEmbeddings wrapper
-            model = SentenceTransformer(Config.EMBEDDING_MODEL)
-            from sentence_transformers import SentenceTransformer
-            model_name = "sentence-transformers/all-MiniLM-L6-v2"
+            model_name = getattr(Config, "EMBEDDING_MODEL", None) or self.DEFAULT_EMBEDDING_MODEL
             logger.info(f"🔍 Attempting to load model: {model_name}")
-            model = SentenceTransformer(model_name)
+            try:
+                model = SentenceTransformer(model_name)
+            except Exception as e:
+                if model_name == self.DEFAULT_EMBEDDING_MODEL:
+                    raise
+                logger.warning(f"⚠️ Could not load {model_name} ({e}); falling back to {self.DEFAULT_EMBEDDING_MODEL}")
+                model_name = self.DEFAULT_EMBEDDING_MODEL
+                model = SentenceTransformer(model_name)
+            # Inference only; under gunicorn --preload this instance is shared copy-on-write
+            model.eval()
+            import torch
+            precision = "fp32"
+            if torch.cuda.is_available():
+                # SentenceTransformer already placed the model on the GPU; FP16 halves memory traffic
+                model.half()
+                precision = "fp16"
             # Create a simple wrapper
             class SimpleEmbeddings:
-                def __init__(self, model):
+                # Large batches amortize per-call overhead during bulk ingestion
+                DOCUMENT_BATCH_SIZE = 128
+
+                def __init__(self, model, cache_key):
                     self.model = model
+                    # Embedding-cache key: backend, precision and model
+                    self.cache_key = cache_key
                 def embed_documents(self, texts):
-                    return self.model.encode(texts).tolist()
+                    return self.model.encode(
+                        texts,
+                        batch_size=self.DOCUMENT_BATCH_SIZE,
+                        convert_to_numpy=True,
+                        normalize_embeddings=True,
+                        show_progress_bar=False
+                    ).tolist()
                 def embed_query(self, text):
-                    return self.model.encode([text])[0].tolist()
+                    return self.model.encode(
+                        [text],
+                        batch_size=1,
+                        convert_to_numpy=True,
+                        normalize_embeddings=True,
+                        show_progress_bar=False
+                    )[0].tolist()
             
-            self.embeddings = SimpleEmbeddings(model)
+            self.embeddings = SimpleEmbeddings(model, f"torch-{precision}:{model_name}")
             logger.info("✅ Embeddings initialized successfully")
             
         except Exception as e:
@@ -43,8 +82,51 @@ class LangChainSetup:
             logger.error(f"❌ Failed to initialize embeddings: {e}")
             logger.error(traceback.format_exc())
     
+    @staticmethod
+    def _configure_torch_threads():
+        """
+        Size the OpenMP/MKL and torch thread pools before torch is first imported: all cores
+        unless OMP_NUM_THREADS is already set (the Docker image pins 1; Gunicorn workers
+        re-pin in post_fork)
+        """
+        n = max(1, os.cpu_count() or 1)
+        os.environ.setdefault("OMP_NUM_THREADS", str(n))
+        os.environ.setdefault("MKL_NUM_THREADS", os.environ["OMP_NUM_THREADS"])
+        import torch
+        threads = max(1, int(os.environ["OMP_NUM_THREADS"]))
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(max(1, threads // 2))
+        except RuntimeError:
+            # Only allowed before any inter-op parallel work has started
+            pass
+
+    def _init_onnx_embeddings(self, required=True):
+        """
+        Run the embedding model on ONNX Runtime; returns False to fall back to torch.
+        Prefers the int8 export, then a plain FP32 export; build one with scripts/export_onnx_embeddings.py
+        """
+        model_dir = Config.ONNX_EMBEDDING_DIR
+        model_file = Config.ONNX_EMBEDDING_FILE
+        log_missing = logger.warning if required else logger.info
+        if not os.path.exists(os.path.join(model_dir, model_file)):
+            model_file = "model.onnx"
+        if not os.path.exists(os.path.join(model_dir, model_file)):
+            log_missing(f"⚠️ No ONNX embedding model in {model_dir}; using SentenceTransformer")
+            return False
+        try:
+            from utils.onnx_embeddings import OnnxEmbeddings
+            self.embeddings = OnnxEmbeddings(model_dir, model_file)
+            logger.info(f"✅ Embeddings initialized successfully (ONNX Runtime, {model_file})")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ ONNX embeddings unavailable, falling back to SentenceTransformer: {e}")
+            return False
+    
     def create_custom_prompt(self):
-        """Create custom prompt template for mining domain"""
+        """Custom prompt template for mining domain (one shared instance)"""
+        if self._prompt is not None:
+            return self._prompt
         
         prompt_template = """You are an expert mining and infrastructure management assistant. 
 Use the following context to provide a concise, actionable answer in 3-4 sentences maximum.
@@ -62,19 +144,22 @@ Guidelines:
 
 Concise Answer:"""
 
-        return PromptTemplate(
+        self._prompt = PromptTemplate(
             template=prompt_template,
             input_variables=["context", "question"]
         )
+        return self._prompt
     
     def create_text_splitter(self):
-        """Create text splitter for document processing"""
-        return RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
+        """Text splitter for document processing (one shared instance)"""
+        if self._splitter is None:
+            self._splitter = RecursiveCharacterTextSplitter(
+                chunk_size=Config.CHUNK_SIZE,
+                chunk_overlap=Config.CHUNK_OVERLAP,
+                length_function=len,
+                separators=["\n\n", "\n", ". ", " ", ""]
+            )
+        return self._splitter
     
     def create_documents_from_texts(self, texts, metadatas=None):
         """Create LangChain documents from text list"""
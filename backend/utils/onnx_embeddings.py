@@ -0,0 +1,117 @@
+import os
+import logging
+import shutil
+import tempfile
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class OnnxEmbeddings:
+    """
+    Sentence embeddings from an (int8-quantized) ONNX export of the embedding model.
+    Same interface as the SentenceTransformer wrapper: embed_documents / embed_query.
+    Build the model directory with scripts/export_onnx_embeddings.py.
+    """
+
+    def __init__(self, model_dir, model_file="model_int8.onnx", batch_size=64, max_length=256):
+        self.model_dir = model_dir
+        self.model_path = os.path.join(model_dir, model_file)
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(self.model_path)
+        # Embedding-cache key: the int8 and FP32 exports produce different vectors
+        self.cache_key = f"onnx:{os.path.basename(os.path.normpath(model_dir))}/{model_file}"
+        self.batch_size = batch_size
+        self.max_length = max_length
+        # The tokenizer and ORT session (and its thread pool) are built on first use in each
+        # process, so a preloading Gunicorn master never forks them into its workers
+        self._loaded_pid = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded_pid == os.getpid():
+                return
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+            # Full graph fusion (attention, LayerNorm, GELU); one intra-op thread per core unless
+            # OMP_NUM_THREADS pins fewer (e.g. one per Gunicorn worker)
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.intra_op_num_threads = int(os.getenv("OMP_NUM_THREADS") or os.cpu_count() or 1)
+            options.inter_op_num_threads = 1
+            self.session = ort.InferenceSession(
+                self.model_path,
+                sess_options=options,
+                providers=["CPUExecutionProvider"]
+            )
+            self._input_names = {i.name for i in self.session.get_inputs()}
+            self._loaded_pid = os.getpid()
+            logger.info(f"✅ ONNX embedding model loaded: {self.model_path}")
+
+    def _encode(self, texts):
+        if self._loaded_pid != os.getpid():
+            self._load()
+        outputs = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            inputs = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            feed = {k: v.astype(np.int64) for k, v in inputs.items() if k in self._input_names}
+            token_embeddings = self.session.run(None, feed)[0]
+            # Mean-pool over real tokens, then L2-normalize (matches the sentence-transformers pipeline)
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(pooled.astype(np.float32))
+        return np.vstack(outputs) if outputs else np.empty((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts):
+        return self._encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+
+def export_onnx_model(model_name, output_dir, quantized_file=None):
+    """
+    Export `model_name` to output_dir/model.onnx (plus its tokenizer) with optimum; with
+    `quantized_file`, also write an int8 dynamically-quantized copy. Returns the model file name.
+    Everything is built in a scratch directory next to output_dir and moved in afterwards,
+    model files last, so a reader never sees a model without its tokenizer or a partial file.
+    """
+    from optimum.exporters.onnx import main_export
+    from transformers import AutoTokenizer
+
+    output_dir = os.path.abspath(output_dir)
+    parent = os.path.dirname(output_dir)
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=".onnx-export-", dir=parent)
+    try:
+        main_export(model_name, output=build_dir, task="feature-extraction")
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(build_dir)
+        model_files = ["model.onnx"]
+        if quantized_file:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(
+                os.path.join(build_dir, "model.onnx"),
+                os.path.join(build_dir, quantized_file),
+                weight_type=QuantType.QInt8
+            )
+            model_files.append(quantized_file)
+
+        # Same filesystem as output_dir, so each os.replace is an atomic rename
+        os.makedirs(output_dir, exist_ok=True)
+        names = sorted(os.listdir(build_dir), key=lambda name: name in model_files)
+        for name in names:
+            os.replace(os.path.join(build_dir, name), os.path.join(output_dir, name))
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+    return quantized_file or "model.onnx"
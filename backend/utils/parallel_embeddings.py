@@ -0,0 +1,74 @@
+import logging
+import multiprocessing as mp
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Per-process SentenceTransformer, loaded once by _init_worker
+_model = None
+
+
+def _init_worker(model_name):
+    """Load the model in a worker process; one intra-op thread each so workers don't contend"""
+    global _model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(1)
+    _model = SentenceTransformer(model_name, device="cpu")
+    _model.eval()
+
+
+def _encode(texts):
+    return _model.encode(
+        texts,
+        batch_size=128,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    )
+
+
+class ParallelEmbeddings:
+    """
+    Data-parallel document embedding for bulk CPU ingestion: each of `processes` spawned
+    workers holds its own model and encodes one shard of every batch. The pool is started
+    on first use and kept for the life of the process.
+    """
+
+    def __init__(self, model_name, processes):
+        self.model_name = model_name
+        self.processes = processes
+        # Workers run the torch model in FP32 on CPU
+        self.cache_key = f"torch-fp32:{model_name}"
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: a fork would inherit torch threads and the parent's model
+                ctx = mp.get_context("spawn")
+                self._pool = ctx.Pool(
+                    self.processes,
+                    initializer=_init_worker,
+                    initargs=(self.model_name,)
+                )
+                logger.info(f"✅ Started {self.processes} embedding worker processes")
+            return self._pool
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        shard = -(-len(texts) // self.processes)
+        shards = [texts[i:i + shard] for i in range(0, len(texts), shard)]
+        return np.concatenate(self._get_pool().map(_encode, shards)).tolist()
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import numpy as np
+from utils import json_utils
+from utils.file_utils import write_atomic
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with an optional time-to-live per entry"""
+
+    def __init__(self, maxsize=512, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SemanticQueryCache:
+    """
+    Similarity cache over recent query embeddings.
+    Vectors are L2-normalized so a single matrix-vector product gives cosine scores;
+    once full, the least recently used slot is overwritten.
+    """
+
+    def __init__(self, capacity=1000, threshold=0.92, ttl=None, dim=None):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self._vecs = np.empty((capacity, dim), dtype=np.float32) if dim else None
+        self._values = [None] * capacity
+        self._tags = [None] * capacity
+        # Wall-clock expiry so entries restored from disk keep their deadline
+        self._expires = np.full(capacity, np.inf)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._clock = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vec):
+        vec = np.asarray(vec, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _touch(self, slot):
+        self._clock += 1
+        self._last_used[slot] = self._clock
+
+    def lookup(self, vec, tag=None):
+        """Return the cached value of the most similar entry (with the same tag, if given), or None"""
+        q = self._normalize(vec)
+        with self._lock:
+            n = self._size
+            if n == 0 or self._vecs.shape[1] != q.shape[0]:
+                return None
+            sims = self._vecs[:n] @ q
+            sims[self._expires[:n] < time.time()] = -np.inf
+            if tag is not None:
+                sims[[t != tag for t in self._tags[:n]]] = -np.inf
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                self._touch(best)
+                return self._values[best]
+        return None
+
+    def add(self, vec, value, tag=None, expires=None):
+        """Store `value` under `vec`; `expires` is an absolute time.time() deadline overriding the ttl"""
+        q = self._normalize(vec)
+        if expires is None:
+            expires = time.time() + self.ttl if self.ttl else np.inf
+        with self._lock:
+            if self._vecs is None or self._vecs.shape[1] != q.shape[0]:
+                self._vecs = np.empty((self.capacity, q.shape[0]), dtype=np.float32)
+                self._size = 0
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                # Expired entries go first, then the least recently used one
+                expired = np.flatnonzero(self._expires < time.time())
+                slot = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+            self._vecs[slot] = q
+            self._values[slot] = value
+            self._tags[slot] = tag
+            self._expires[slot] = expires
+            self._touch(slot)
+
+    def save(self, path):
+        """
+        Write vectors to `{path}.npz` and entries to `{path}.json` for a warm start.
+        Both files carry the same save version and entry count, checked by load()
+        """
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return
+            vecs = self._vecs[:n].copy()
+            entries = [
+                {
+                    "value": self._values[i],
+                    "tag": self._tags[i],
+                    "expires": None if np.isinf(self._expires[i]) else float(self._expires[i]),
+                }
+                for i in range(n)
+            ]
+        version = uuid.uuid4().hex
+        meta = json_utils.dumps({"version": version, "count": n, "entries": entries})
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        write_atomic(f"{path}.json", lambda f: f.write(meta))
+        write_atomic(f"{path}.npz", lambda f: np.savez(f, vecs=vecs, version=np.array(version)))
+
+    def load(self, path):
+        """Restore entries written by save(); returns the number loaded (0 if the files don't match)"""
+        if not (os.path.exists(f"{path}.npz") and os.path.exists(f"{path}.json")):
+            return 0
+        with np.load(f"{path}.npz", allow_pickle=False) as data:
+            vecs = data["vecs"]
+            version = str(data["version"])
+        with open(f"{path}.json", "rb") as f:
+            meta = json_utils.loads(f.read())
+        if not isinstance(meta, dict) or meta.get("version") != version:
+            # Older format, or files from two different saves (e.g. two workers exiting together)
+            return 0
+        entries = meta["entries"]
+        if meta.get("count") != len(entries) or len(entries) != len(vecs):
+            return 0
+        now = time.time()
+        for vec, entry in zip(vecs, entries):
+            expires = entry["expires"]
+            if expires is not None and expires < now:
+                continue
+            self.add(vec, entry["value"], tag=entry["tag"], expires=expires if expires is not None else np.inf)
+        return self._size
+
+    def clear(self):
+        with self._lock:
+            self._values = [None] * self.capacity
+            self._tags = [None] * self.capacity
+            self._expires[:] = np.inf
+            self._last_used[:] = 0
+            self._size = 0
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,34 @@
+import functools
+import threading
+import time
+
+
+def ttl_cache(seconds, key=None):
+    """
+    Memoize a function's return value for `seconds` (monotonic clock).
+    `key` maps the call arguments to a cache key (defaults to the arguments themselves).
+    Exceptions are never cached; call `fn.invalidate()` to drop all entries.
+    """
+    def decorator(fn):
+        entries = {}
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            with lock:
+                hit = entries.get(cache_key)
+                if hit is not None and hit[0] > time.monotonic():
+                    return hit[1]
+            value = fn(*args, **kwargs)
+            with lock:
+                entries[cache_key] = (time.monotonic() + seconds, value)
+            return value
+
+        def invalidate():
+            with lock:
+                entries.clear()
+
+        wrapper.invalidate = invalidate
+        return wrapper
+    return decorator
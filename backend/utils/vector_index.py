@@ -0,0 +1,224 @@
+import os
+import threading
+import uuid
+import logging
+import numpy as np
+from utils import json_utils
+from utils.file_utils import write_atomic
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+class VectorIndex:
+    """
+    In-memory inner-product index over L2-normalized embeddings (cosine similarity),
+    with document text and metadata kept in lists aligned to the vector ids.
+    Chroma stays the persistent store; this only serves the query hot path.
+
+    Backends: FAISS (exact IndexFlatIP, or approximate IndexHNSWFlat once the corpus reaches
+    `hnsw_threshold` vectors), or a contiguous NumPy float32 matrix where a search is
+    one BLAS SGEMV (SGEMM for batched queries).
+
+    precision="int8" stores each component as one byte instead of four (FAISS scalar
+    quantizer over the fixed [-1, 1] range of normalized vectors; int8 rows scaled by 127
+    for NumPy), for 4x more vectors in the same RAM at a small recall cost.
+    """
+
+    HNSW_M = 32
+    HNSW_EF_SEARCH = 64
+    # NumPy int8 backend: rows dequantized per block while scoring, bounding the float32 temporaries
+    INT8_SCORE_BLOCK = 65536
+    # Saved index files start with this tag and the save version shared with the .meta.json file
+    SAVE_MAGIC = b"RKTVIDX1"
+
+    def __init__(self, backend="auto", hnsw_threshold=100_000, precision="float32"):
+        if backend == "auto":
+            backend = "faiss" if faiss is not None else "numpy"
+        if backend == "faiss" and faiss is None:
+            logger.warning("⚠️ faiss not installed; using NumPy vector index")
+            backend = "numpy"
+        self.backend = backend
+        self.hnsw_threshold = hnsw_threshold
+        self.int8 = precision == "int8"
+        self._index = None
+        self._corpus = None  # NumPy backend: row-major (capacity, dim) float32 buffer
+        self._size = 0
+        self._texts = []
+        self._metadatas = []
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return True
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+
+    def load_from_collection(self, collection):
+        """(Re)build the index from every vector stored in a Chroma collection"""
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        embeddings = data.get("embeddings")
+        with self._lock:
+            self._index = None
+            self._corpus = None
+            self._size = 0
+            self._texts = []
+            self._metadatas = []
+        if embeddings is not None and len(embeddings):
+            self.add(embeddings, data.get("documents") or [], data.get("metadatas") or [],
+                     expected_total=len(embeddings))
+        logger.info(f"✅ In-memory vector index ready with {len(self)} vectors ({self.backend})")
+
+    def _new_faiss_index(self, dim, expected_total):
+        hnsw = expected_total >= self.hnsw_threshold
+        if self.int8:
+            qtype = faiss.ScalarQuantizer.QT_8bit_uniform
+            if hnsw:
+                index = faiss.IndexHNSWSQ(dim, qtype, self.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT)
+            # Normalized components lie in [-1, 1]; training on the two extremes fixes that range
+            index.train(np.array([[-1.0] * dim, [1.0] * dim], dtype=np.float32))
+        elif hnsw:
+            index = faiss.IndexHNSWFlat(dim, self.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        else:
+            return faiss.IndexFlatIP(dim)
+        if hnsw:
+            index.hnsw.efSearch = self.HNSW_EF_SEARCH
+        return index
+
+    @staticmethod
+    def _is_int8_index(index):
+        return isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexHNSWSQ))
+
+    def add(self, embeddings, texts, metadatas, expected_total=None):
+        vectors = self._normalize(embeddings)
+        n = vectors.shape[0]
+        if n == 0:
+            return
+        with self._lock:
+            if self.backend == "faiss":
+                if self._index is None:
+                    self._index = self._new_faiss_index(vectors.shape[1], expected_total or n)
+                self._index.add(vectors)
+            else:
+                self._append_rows(vectors)
+            self._size += n
+            self._texts.extend(texts)
+            self._metadatas.extend(m or {} for m in metadatas)
+
+    def _append_rows(self, vectors):
+        # Grow geometrically so incremental ingestion stays amortized O(1) per row
+        needed = self._size + vectors.shape[0]
+        if self.int8:
+            vectors = np.clip(np.rint(vectors * 127), -127, 127).astype(np.int8)
+        if self._corpus is None or needed > self._corpus.shape[0]:
+            capacity = max(needed, 2 * (self._corpus.shape[0] if self._corpus is not None else 0), 1024)
+            grown = np.empty((capacity, vectors.shape[1]), dtype=vectors.dtype)
+            if self._size:
+                grown[:self._size] = self._corpus[:self._size]
+            self._corpus = grown
+        self._corpus[self._size:needed] = vectors
+
+    def search(self, query_vector, k=5):
+        """Return [(text, metadata, score)] for the k most similar vectors"""
+        results = self.search_batch([query_vector], k=k)
+        return results[0] if results else []
+
+    def search_batch(self, query_vectors, k=5):
+        """Search several queries at once; returns one result list per query"""
+        queries = self._normalize(query_vectors)
+        with self._lock:
+            if self._size == 0:
+                return [[] for _ in range(queries.shape[0])]
+            k = min(k, self._size)
+            if self.backend == "faiss":
+                scores, ids = self._index.search(queries, k)
+            else:
+                scores, ids = self._top_k(queries, k)
+            return [
+                [(self._texts[i], self._metadatas[i], float(score)) for i, score in zip(row_ids, row_scores) if i >= 0]
+                for row_ids, row_scores in zip(ids, scores)
+            ]
+
+    def _top_k(self, queries, k):
+        if self.int8:
+            sims = np.empty((queries.shape[0], self._size), dtype=np.float32)
+            for start in range(0, self._size, self.INT8_SCORE_BLOCK):
+                stop = min(start + self.INT8_SCORE_BLOCK, self._size)
+                sims[:, start:stop] = queries @ self._corpus[start:stop].astype(np.float32).T
+            sims /= 127
+        else:
+            sims = queries @ self._corpus[:self._size].T  # (q, N) via BLAS
+        if k < self._size:
+            ids = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        else:
+            ids = np.broadcast_to(np.arange(self._size), (sims.shape[0], self._size))
+        top = np.take_along_axis(sims, ids, axis=1)
+        order = np.argsort(-top, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def save(self, path):
+        """
+        Write the FAISS index to `path` and texts/metadatas to `{path}.meta.json` (FAISS backend only).
+        Both files carry the same save version, so load() rejects a pair from two different saves.
+        """
+        if self.backend != "faiss":
+            return False
+        with self._lock:
+            if self._index is None:
+                return False
+            index_bytes = faiss.serialize_index(self._index)
+            version = uuid.uuid4().hex
+            meta = json_utils.dumps({
+                "version": version,
+                "count": self._index.ntotal,
+                "texts": self._texts,
+                "metadatas": self._metadatas
+            })
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        write_atomic(f"{path}.meta.json", lambda f: f.write(meta))
+        write_atomic(path, lambda f: f.writelines([self.SAVE_MAGIC, version.encode("ascii"), index_bytes.tobytes()]))
+        return True
+
+    def load(self, path, expected_count=None):
+        """Restore an index written by save(); False if missing, mismatched or not `expected_count` vectors"""
+        if self.backend != "faiss" or not (os.path.exists(path) and os.path.exists(f"{path}.meta.json")):
+            return False
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(f"{path}.meta.json", "rb") as f:
+            meta = json_utils.loads(f.read())
+        header = len(self.SAVE_MAGIC) + 32
+        if data[:len(self.SAVE_MAGIC)] != self.SAVE_MAGIC or meta.get("version") != data[len(self.SAVE_MAGIC):header].decode("ascii", "replace"):
+            # Written by an older version, or the two files come from different saves
+            return False
+        index = faiss.deserialize_index(np.frombuffer(data, dtype=np.uint8, offset=header))
+        if index.ntotal != meta.get("count") or index.ntotal != len(meta["texts"]):
+            return False
+        if expected_count is not None and index.ntotal != expected_count:
+            return False
+        if self._is_int8_index(index) != self.int8:
+            # Precision setting changed since the save; rebuild from the collection
+            return False
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = self.HNSW_EF_SEARCH
+        with self._lock:
+            self._index = index
+            self._size = index.ntotal
+            self._texts = meta["texts"]
+            self._metadatas = meta["metadatas"]
+        logger.info(f"✅ Loaded vector index with {self._size} vectors from {path}")
+        return True
+
+    def __len__(self):
+        return self._size
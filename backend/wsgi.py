@@ -8,7 +8,7 @@ import sys
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, initialize_services
+from app import app, initialize_services, start_worker_tasks
 
 # Initialize services when the WSGI app loads
 initialize_services()
@@ -18,4 +18,5 @@ application = app
 
 if __name__ == "__main__":
     # This allows running: python wsgi.py (for development)
+    start_worker_tasks()
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file